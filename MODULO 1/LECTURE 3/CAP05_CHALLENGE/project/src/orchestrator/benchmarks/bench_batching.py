@@ -0,0 +1,69 @@
+"""Upstream call rate and latency of concurrent query embeddings, with and
+without the cross-request micro-batcher.
+
+Start the fake embeddings server first:
+
+    uvicorn mocks.fake_embeddings_server:app --port 8100
+    python -m benchmarks.bench_batching
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+from retrieval.embeddings import BatchedEmbeddings, RemoteEmbeddings
+from util.http import http_pool
+
+CONCURRENCY = [10, 50, 200]
+
+
+async def fetch_stats(session, host: str, reset: bool = False) -> dict:
+    method = session.post if reset else session.get
+    async with method(f"{host}/{'reset' if reset else 'stats'}") as response:
+        return await response.json()
+
+
+async def timed(embeddings, text: str) -> float:
+    start = time.perf_counter()
+    await embeddings.run([text])
+    return time.perf_counter() - start
+
+
+async def measure(embeddings, session, host: str, concurrency: int):
+    await fetch_stats(session, host, reset=True)
+    start = time.perf_counter()
+    latencies = await asyncio.gather(
+        *[timed(embeddings, f"query number {i}") for i in range(concurrency)]
+    )
+    elapsed = time.perf_counter() - start
+    calls = (await fetch_stats(session, host))["requests"]
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return calls, calls / elapsed, p50, p99
+
+
+async def main(host: str, max_wait: float):
+    remote = RemoteEmbeddings(url=f"{host}/encode")
+    batched = BatchedEmbeddings(remote, max_wait=max_wait)
+    header = ("mode", "queries", "calls", "calls/s", "p50", "p99")
+    print("{:>9} {:>8} {:>6} {:>8} {:>9} {:>9}".format(*header))
+    async with aiohttp.ClientSession() as session:
+        for concurrency in CONCURRENCY:
+            for mode, embeddings in (("direct", remote), ("batched", batched)):
+                calls, rate, p50, p99 = await measure(
+                    embeddings, session, host, concurrency
+                )
+                print(
+                    f"{mode:>9} {concurrency:>8} {calls:>6} {rate:>8.1f} "
+                    f"{p50:>7.1f}ms {p99:>7.1f}ms"
+                )
+    await http_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="http://localhost:8100")
+    parser.add_argument("--max-wait", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.max_wait))
@@ -0,0 +1,63 @@
+"""Concurrent chats per worker: blocking sync stream against OpenAIChat.
+
+Start the fake LLM server and point the openai client at it:
+
+    uvicorn mocks.fake_llm_server:app --port 8200
+    OPENAI_API_BASE=http://localhost:8200/v1 OPENAI_API_KEY=fake \\
+        python -m benchmarks.bench_chat
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import openai
+
+from llm import OpenAIChat
+
+CONCURRENCY = [1, 10, 50]
+
+
+async def legacy_stream(prompt: str):
+    """Previous stream_chat, iterated inside an async generator."""
+
+    for chunk in openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        temperature=0.0,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    ):
+        content = chunk["choices"][0].get("delta", {}).get("content")  # type: ignore
+        if content is not None:
+            yield content
+
+
+async def one_chat(stream) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _ in stream("hello"):
+        if first is None:
+            first = time.perf_counter() - start
+    return first or 0.0, time.perf_counter() - start
+
+
+async def main():
+    chat = OpenAIChat()
+    print(f"{'mode':>7} {'chats':>6} {'chats/s':>8} {'ttft p50':>9} {'ttft p99':>9}")
+    for concurrency in CONCURRENCY:
+        for mode, stream in (("sync", legacy_stream), ("async", chat.stream)):
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *[one_chat(stream) for _ in range(concurrency)]
+            )
+            rate = concurrency / (time.perf_counter() - start)
+            p50, p99 = np.percentile([first for first, _ in results], [50, 99])
+            print(
+                f"{mode:>7} {concurrency:>6} {rate:>8.2f} "
+                f"{p50 * 1000:>7.0f}ms {p99 * 1000:>7.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__).parse_args()
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Chunking throughput in MB/s: LangChainSplitter against the native splitter.
+
+Uses the saved fixture pages from bench_extract when there are any, and
+synthetic text otherwise:
+
+    python -m benchmarks.bench_chunker
+"""
+import argparse
+import asyncio
+from pathlib import Path
+import random
+import time
+
+from retrieval.chunker import RecursiveCharacterSplitter
+from retrieval.extract import html_to_text
+from retrieval.splitter import LangChainSplitter
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+
+
+def load_texts() -> list[str]:
+    texts = [
+        html_to_text(path.read_text(errors="ignore"), "html.parser")
+        for path in sorted(FIXTURES.glob("*.html"))
+    ]
+    if texts:
+        return texts
+    rng = random.Random(0)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "elit"]
+    return [
+        "\n\n".join(
+            "\n".join(
+                " ".join(rng.choice(words) for _ in range(rng.randint(5, 60)))
+                for _ in range(rng.randint(1, 8))
+            )
+            for _ in range(200)
+        )
+        for _ in range(20)
+    ]
+
+
+async def throughput(splitter, texts: list[str], rounds: int) -> tuple[float, int]:
+    size = sum(len(text.encode()) for text in texts) * rounds
+    chunks = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            chunks += len(await splitter.split(text))
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 1e6, chunks
+
+
+async def main(rounds: int):
+    texts = load_texts()
+    print(f"{len(texts)} texts, {sum(map(len, texts)) / 1e6:.2f}M characters")
+    for name, splitter in (
+        ("langchain", LangChainSplitter(400, 50, len)),
+        ("native", RecursiveCharacterSplitter(400, 50, len)),
+    ):
+        rate, chunks = await throughput(splitter, texts, rounds)
+        print(f"{name:>10} {rate:>8.2f} MB/s {chunks} chunks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds))
@@ -0,0 +1,75 @@
+"""Latency of parallel /streamingSearch requests against a running orchestrator.
+
+Run it once per configuration and compare the reports, e.g. per cache backend:
+
+    CACHE_BACKEND=sync docker compose up orchestrator
+    python -m benchmarks.bench_concurrency --label sync
+
+    CACHE_BACKEND=async docker compose up orchestrator
+    python -m benchmarks.bench_concurrency --label async
+
+or with and without progressive context, looking at the first token times:
+
+    PROGRESSIVE_CONTEXT=true docker compose up orchestrator
+    python -m benchmarks.bench_concurrency --label progressive
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+QUERIES = [
+    "what is a vector database",
+    "how does redis store json documents",
+    "difference between flat and hnsw indexes",
+    "what is retrieval augmented generation",
+    "how do server sent events work",
+]
+
+
+async def stream_once(
+    session, url: str, query: str
+) -> tuple[float, float, float]:
+    """Returns (time to first event, time to first token, total time) for one
+    streaming request."""
+
+    start = time.perf_counter()
+    first_event = first_token = None
+    async with session.get(url, params={"query": query}) as response:
+        async for line in response.content:
+            if first_event is None:
+                first_event = time.perf_counter() - start
+            if first_token is None and line.strip() == b"event: token":
+                first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_event or total, first_token or total, total
+
+
+def report(label: str, name: str, samples: list[float]):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    print(f"{label:>8} {name:>12} p50={p50:.3f}s p95={p95:.3f}s p99={p99:.3f}s")
+
+
+async def main(url: str, concurrency: int, label: str):
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        tasks = [
+            stream_once(session, url, QUERIES[i % len(QUERIES)])
+            for i in range(concurrency)
+        ]
+        results = await asyncio.gather(*tasks)
+
+    report(label, "first event", [first for first, _, _ in results])
+    report(label, "first token", [token for _, token, _ in results])
+    report(label, "total", [total for _, _, total in results])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/streamingSearch")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--label", default="run")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrency, args.label))
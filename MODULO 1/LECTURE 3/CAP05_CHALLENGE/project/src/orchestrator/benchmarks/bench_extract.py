@@ -0,0 +1,86 @@
+"""Pages per second and event-loop lag of HTML to text extraction.
+
+Reads every .html file in the fixture corpus. Populate it once with real pages:
+
+    python -m benchmarks.bench_extract --download benchmarks/fixtures/urls.txt
+    python -m benchmarks.bench_extract
+"""
+import argparse
+import asyncio
+from pathlib import Path
+import time
+
+import aiohttp
+import numpy as np
+
+from retrieval.extract import HtmlExtractor
+
+CORPUS = Path(__file__).parent / "fixtures" / "html"
+TICK = 0.01
+
+
+async def download(urls_file: Path):
+    CORPUS.mkdir(parents=True, exist_ok=True)
+    urls = [url for url in urls_file.read_text().split() if url]
+    async with aiohttp.ClientSession() as session:
+        for i, url in enumerate(urls):
+            async with session.get(url) as response:
+                (CORPUS / f"page_{i:03}.html").write_text(await response.text())
+                print(f"saved {url}")
+
+
+async def measure_lag(samples: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - start - TICK)
+
+
+async def run(extractor: HtmlExtractor, pages: list[str], rounds: int):
+    await extractor.extract(pages[0])  # spawn workers before timing
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(lags, stop))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*[extractor.extract(page) for page in pages])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    extractor.close()
+    p50, p99, worst = np.percentile(lags or [0.0], [50, 99, 100]) * 1000
+    return len(pages) * rounds / elapsed, p50, p99, worst
+
+
+async def main(workers: int, rounds: int):
+    pages = [path.read_text() for path in sorted(CORPUS.glob("*.html"))]
+    if not pages:
+        raise SystemExit(f"No fixture pages in {CORPUS}, run with --download first")
+    size = sum(len(page) for page in pages) / 1e6
+    print(f"{len(pages)} pages, {size:.1f} MB")
+
+    modes = [("inline", 0, "html.parser")] + [
+        (f"pool x{workers}", workers, backend)
+        for backend in ("html.parser", "lxml", "selectolax")
+    ]
+    for label, pool_size, backend in modes:
+        extractor = HtmlExtractor(workers=pool_size, backend=backend, cpu_limit=0)
+        rate, p50, p99, worst = await run(extractor, pages, rounds)
+        print(
+            f"{label:>9} {backend:>12} {rate:8.1f} pages/s "
+            f"loop lag p50={p50:6.1f}ms p99={p99:7.1f}ms max={worst:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--download", type=Path)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    if args.download:
+        asyncio.run(download(args.download))
+    else:
+        asyncio.run(main(args.workers, args.rounds))
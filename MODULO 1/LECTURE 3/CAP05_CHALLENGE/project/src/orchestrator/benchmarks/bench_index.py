@@ -0,0 +1,126 @@
+"""KNN latency and recall@10 of HNSW against FLAT on the chunk index layout.
+
+Loads random vectors under a "bench:<size>:" prefix, builds a FLAT and an HNSW
+index over the same keys and compares them. FLAT results are exact, so they
+are the ground truth for recall. Needs a redis-stack server with enough memory
+(1M chunks at 1536 dimensions is about 6 GB of vectors; use --dim to shrink).
+
+    python -m benchmarks.bench_index --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import redis
+
+from models.document import Document
+from models.index import VectorIndexSettings
+from retrieval.cache import index_definition, index_schema, knn_query, store_chunk
+
+K = 10
+BATCH = 1_000
+
+
+def load(client, prefix: str, size: int, dim: int, rng: np.random.Generator):
+    for offset in range(0, size, BATCH):
+        pipeline = client.pipeline(transaction=False)
+        count = min(BATCH, size - offset)
+        vectors = rng.standard_normal((count, dim)).astype(np.float32)
+        for i, vector in enumerate(vectors):
+            document = Document(text="", url="", vector=vector.tolist(), similarity=-1)
+            store_chunk(pipeline, f"{prefix}{offset + i}", document, "HASH")
+        pipeline.execute()
+
+
+def build(client, name: str, prefix: str, dim: int, settings: VectorIndexSettings):
+    client.ft(name).create_index(
+        fields=index_schema(dim, settings),
+        definition=index_definition(settings, prefix),
+    )
+    while float(client.ft(name).info()["percent_indexed"]) < 1:
+        time.sleep(1)
+
+
+def search(client, name: str, queries, ef_runtime=None) -> tuple[list, list]:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = client.ft(name).search(
+            knn_query(K, ef_runtime).return_fields("vector_score"),
+            {"query_vector": query.tobytes()},
+        ).docs  # type: ignore
+        latencies.append(time.perf_counter() - start)
+        results.append({doc.id for doc in docs})
+    return latencies, results
+
+
+def report(label: str, latencies: list, recall: float):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{label:>24} p50={p50:7.2f}ms p99={p99:7.2f}ms recall@{K}={recall:.3f}")
+
+
+def main(sizes, dim, queries_count, m, ef_construction, ef_runtimes, host, port):
+    client = redis.Redis(host=host, port=port)
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((queries_count, dim)).astype(np.float32)
+
+    for size in sizes:
+        prefix = f"bench:{size}:"
+        flat, hnsw = f"idx:bench_flat_{size}", f"idx:bench_hnsw_{size}"
+        print(f"--- {size} chunks")
+        load(client, prefix, size, dim, rng)
+        build(
+            client,
+            flat,
+            prefix,
+            dim,
+            VectorIndexSettings(storage="HASH", initial_cap=size),
+        )
+        build(
+            client,
+            hnsw,
+            prefix,
+            dim,
+            VectorIndexSettings(
+                storage="HASH",
+                algorithm="HNSW",
+                m=m,
+                ef_construction=ef_construction,
+                initial_cap=size,
+            ),
+        )
+
+        flat_latencies, truth = search(client, flat, queries)
+        report("FLAT", flat_latencies, 1.0)
+        for ef_runtime in ef_runtimes:
+            latencies, results = search(client, hnsw, queries, ef_runtime)
+            recall = np.mean([len(r & t) / K for r, t in zip(results, truth)])
+            report(f"HNSW ef_runtime={ef_runtime}", latencies, float(recall))
+
+        client.ft(flat).dropindex(delete_documents=False)
+        client.ft(hnsw).dropindex(delete_documents=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-runtime", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--host", default="cache")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    main(
+        args.sizes,
+        args.dim,
+        args.queries,
+        args.m,
+        args.ef_construction,
+        args.ef_runtime,
+        args.host,
+        args.port,
+    )
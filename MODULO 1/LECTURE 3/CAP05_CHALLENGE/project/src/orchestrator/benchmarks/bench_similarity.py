@@ -0,0 +1,79 @@
+"""Compares the vectorized top-k engine with the previous DataFrame version.
+
+Run from the orchestrator folder: python -m benchmarks.bench_similarity
+"""
+import asyncio
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from models.document import Document
+from retrieval.retriever import Retriever
+
+SIZES = [100, 1_000, 10_000]
+DIMENSION = 1536
+K = 10
+REPEAT = 5
+
+
+async def legacy_most_similar(query_vector, data, k=5) -> list[Document]:
+    """Previous implementation, kept here as the baseline."""
+
+    query_vector = np.array(query_vector).reshape(1, -1)
+
+    def compute_cosine_similarity(row):
+        return cosine_similarity(query_vector, row)[0][0]
+
+    df: Any = pd.DataFrame(data)
+    df["vector"] = df["vector"].apply(lambda x: np.array(x).reshape(1, -1))
+    df["similarity"] = df["vector"].apply(compute_cosine_similarity)
+    similar = df.nlargest(k, "similarity")[["text", "url", "vector", "similarity"]]
+    similar["vector"] = similar["vector"].apply(lambda x: x[0].tolist())
+
+    json_docs = similar.to_dict("records")
+
+    return [Document(**json_doc) for json_doc in json_docs]
+
+
+def make_chunks(size: int, rng: np.random.Generator) -> list[dict]:
+    vectors = rng.standard_normal((size, DIMENSION)).astype(np.float32)
+    return [
+        {"text": f"chunk {i}", "url": f"https://example.com/{i}", "vector": v}
+        for i, v in enumerate(vectors.tolist())
+    ]
+
+
+async def timeit(fn, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    rng = np.random.default_rng(0)
+    retriever = Retriever.__new__(Retriever)
+    print(f"{'chunks':>8} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for size in SIZES:
+        data = make_chunks(size, rng)
+        query = rng.standard_normal((1, DIMENSION)).tolist()
+
+        expected = [doc.text for doc in await legacy_most_similar(query, data, K)]
+        actual = [doc.text for doc in await retriever.get_most_similar(query, data, K)]
+        assert expected == actual, "top-k mismatch between implementations"
+
+        legacy = await timeit(legacy_most_similar, query, data, K)
+        vectorized = await timeit(retriever.get_most_similar, query, data, K)
+        print(
+            f"{size:>8} {legacy * 1000:>12.2f} {vectorized * 1000:>16.2f} "
+            f"{legacy / vectorized:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""Import time of retrieval.splitter and AdjSenSplitter pages per second.
+
+Uses the saved fixture pages from bench_extract when there are any, and
+synthetic text otherwise:
+
+    python -m benchmarks.bench_splitter --pages 100
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_chunker import load_texts
+from retrieval.splitter import AdjSenSplitter, load_nlp
+
+IMPORT = (
+    "import time; s = time.perf_counter(); import {}; print(time.perf_counter() - s)"
+)
+
+
+def import_time(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT.format(module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout)
+
+
+async def pages_per_second(splitter, texts: list[str], batched: bool) -> float:
+    start = time.perf_counter()
+    if batched:
+        await splitter.split_many(texts)
+    else:
+        for text in texts:
+            await splitter.split(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+async def main(pages: int):
+    print(f"import retrieval.splitter: {import_time('retrieval.splitter'):.3f}s")
+    start = time.perf_counter()
+    load_nlp()
+    print(f"first load_nlp():          {time.perf_counter() - start:.3f}s")
+
+    texts = load_texts()
+    texts = (texts * (pages // len(texts) + 1))[:pages]
+    runs = [
+        ("one by one", AdjSenSplitter(), False),
+        ("pipe", AdjSenSplitter(batch_size=16), True),
+        ("pipe x2", AdjSenSplitter(batch_size=16, n_process=2), True),
+    ]
+    for label, splitter, batched in runs:
+        rate = await pages_per_second(splitter, texts, batched)
+        print(f"{label:>12} {rate:>8.2f} pages/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages))
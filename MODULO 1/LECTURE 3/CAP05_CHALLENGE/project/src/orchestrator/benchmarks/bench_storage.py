@@ -0,0 +1,95 @@
+"""Redis memory per chunk and find_similar latency for JSON and HASH storage.
+
+JSON is the previous layout: vectors as JSON lists, returned and parsed on
+every KNN hit. HASH keeps vectors as packed FLOAT32 blobs and KNN results carry
+only text, url and score.
+
+    python -m benchmarks.bench_storage --chunks 10000
+"""
+import argparse
+import time
+
+import numpy as np
+import redis
+
+from models.document import Document
+from models.index import VectorIndexSettings
+from retrieval.cache import (
+    index_definition,
+    index_schema,
+    knn_query,
+    store_chunk,
+    to_documents,
+)
+
+K = 10
+BATCH = 1_000
+TEXT = "lorem ipsum dolor sit amet " * 15
+
+
+def load(client, prefix: str, vectors: np.ndarray, storage: str):
+    for offset in range(0, len(vectors), BATCH):
+        pipeline = client.pipeline(transaction=False)
+        for i, vector in enumerate(vectors[offset : offset + BATCH]):
+            document = Document(
+                text=TEXT,
+                url=f"https://example.com/{offset + i}",
+                vector=vector.tolist(),
+                similarity=-1,
+            )
+            store_chunk(pipeline, f"{prefix}{offset + i}", document, storage)
+        pipeline.execute()
+
+
+def memory_per_chunk(client, prefix: str, size: int, samples: int = 200) -> float:
+    keys = [f"{prefix}{i}" for i in range(0, size, max(1, size // samples))]
+    return float(np.mean([client.memory_usage(key, samples=0) for key in keys]))
+
+
+def main(size: int, dim: int, queries_count: int, host: str, port: int):
+    client = redis.Redis(host=host, port=port)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    queries = rng.standard_normal((queries_count, dim)).astype(np.float32)
+
+    for storage, with_vectors in (("JSON", True), ("HASH", False)):
+        settings = VectorIndexSettings(storage=storage)  # type: ignore
+        prefix, name = f"bench:{storage.lower()}:", f"idx:bench_{storage.lower()}"
+        load(client, prefix, vectors, storage)
+        client.ft(name).create_index(
+            fields=index_schema(dim, settings),
+            definition=index_definition(settings, prefix),
+        )
+        while float(client.ft(name).info()["percent_indexed"]) < 1:
+            time.sleep(1)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            docs = client.ft(name).search(
+                knn_query(K, with_vectors=with_vectors),
+                {"query_vector": query.tobytes()},
+            ).docs  # type: ignore
+            to_documents(docs)
+            latencies.append(time.perf_counter() - start)
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        memory = memory_per_chunk(client, prefix, size)
+        index_mb = float(client.ft(name).info()["vector_index_sz_mb"])
+        print(
+            f"{storage:>5} memory/chunk={memory / 1024:7.1f}KB "
+            f"vector index={index_mb:8.1f}MB "
+            f"find_similar p50={p50:6.2f}ms p99={p99:6.2f}ms"
+        )
+        client.ft(name).dropindex(delete_documents=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--host", default="cache")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    main(args.chunks, args.dim, args.queries, args.host, args.port)
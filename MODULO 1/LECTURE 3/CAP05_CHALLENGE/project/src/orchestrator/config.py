@@ -0,0 +1,19 @@
+"""Settings shared by the API and the maintenance scripts.
+
+Importing this module only reads the environment; it builds no clients.
+"""
+import os
+
+from models.index import VectorIndexSettings
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "async")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 5))
+INDEX_SETTINGS = VectorIndexSettings(
+    storage=os.environ.get("VECTOR_INDEX_STORAGE", "JSON"),  # type: ignore
+    algorithm=os.environ.get("VECTOR_INDEX_ALGORITHM", "FLAT"),  # type: ignore
+    m=int(os.environ.get("HNSW_M", 16)),
+    ef_construction=int(os.environ.get("HNSW_EF_CONSTRUCTION", 200)),
+    ef_runtime=int(os.environ.get("HNSW_EF_RUNTIME", 10)),
+    initial_cap=os.environ.get("VECTOR_INDEX_INITIAL_CAP") or None,
+)
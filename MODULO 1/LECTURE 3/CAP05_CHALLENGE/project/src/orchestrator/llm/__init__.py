@@ -0,0 +1 @@
+from llm.chat import ChatModel, OpenAIChat
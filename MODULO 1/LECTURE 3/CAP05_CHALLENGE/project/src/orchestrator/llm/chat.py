@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
+import openai
+
+END_OF_STREAM = object()
+
+
+class ChatModel(ABC):
+    """Abstraction of a streaming chat completion client."""
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        pass
+
+
+class OpenAIChat(ChatModel):
+    """Async OpenAI chat client with a bounded buffer between the upstream token
+    stream and the consumer.
+
+    When the buffer is full the upstream reader stops pulling from the socket
+    until the consumer catches up. Closing the stream early, as happens when
+    the SSE client disconnects, cancels the upstream request.
+    """
+
+    def __init__(
+        self,
+        model: str = "gpt-3.5-turbo",
+        temperature: float = 0.0,
+        buffer_size: int = 64,
+    ) -> None:
+        self.model = model
+        self.temperature = temperature
+        self.buffer_size = buffer_size
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_size)
+        producer = asyncio.create_task(self.produce(prompt, buffer))
+        try:
+            while True:
+                item = await buffer.get()
+                if item is END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+
+    async def produce(self, prompt: str, buffer: asyncio.Queue):
+        try:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                temperature=self.temperature,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            )
+            try:
+                async for chunk in response:  # type: ignore
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content is not None:
+                        await buffer.put(content)
+            finally:
+                await response.aclose()  # type: ignore
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await buffer.put(e)
+            return
+        await buffer.put(END_OF_STREAM)
@@ -1,76 +1,353 @@
-from typing import AsyncGenerator
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
+import time
+from typing import AsyncGenerator, Optional
+from urllib.parse import urlsplit
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 from util import logger
+from util.http import http_pool
 
 import prompt
-import openai
+import redis.asyncio as aioredis
+from config import (
+    CACHE_BACKEND,
+    INDEX_SETTINGS,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+)
+from llm import OpenAIChat
+from models.scrape import ScrapeReport
 from retrieval import Retriever
-from retrieval.search import GoogleAPI
-from retrieval.cache import RedisVectorCache
+from retrieval.answers import AnswerCache
+from retrieval.extract import html_extractor
+from retrieval.pages import PageCache
+from retrieval.search import GOOGLE_API_URL, CachedSearcher, GoogleAPI
+from retrieval.cache import AsyncRedisVectorCache, RedisVectorCache
 from retrieval.scraper import ScraperLocal, ScraperRemote
-from retrieval.embeddings import OpenAIEmbeddings, RemoteEmbeddings
-from retrieval.splitter import LangChainSplitter
+from retrieval.embeddings import (
+    BatchedEmbeddings,
+    CachedEmbeddings,
+    OpenAIEmbeddings,
+    RemoteEmbeddings,
+)
+from retrieval.chunker import RecursiveCharacterSplitter
+from retrieval.tokens import ContextPacker, TokenCounter
 
 
 # # setup loggers
 # logging.config.fileConfig("logging.conf", disable_existing_loggers=False)  # type: ignore
 # logger = logging.getLogger(__name__)
-app = FastAPI()
 
 
-def stream_chat(prompt: str):
-    for chunk in openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        temperature=0.0,
-        messages=[{"role": "user", "content": prompt}],
-        stream=True,
-    ):
-        content = chunk["choices"][0].get("delta", {}).get("content")  # type: ignore
-        if content is not None:
-            yield content
+EMBEDDINGS_CACHE_SIZE = int(os.environ.get("EMBEDDINGS_CACHE_SIZE", 10_000))
+EMBEDDINGS_CACHE_TTL = int(os.environ.get("EMBEDDINGS_CACHE_TTL", 86_400))
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 3600))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 3600))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 1000))
+ANSWER_CACHE_TRESHOLD = float(os.environ.get("ANSWER_CACHE_TRESHOLD", 0.95))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 1000))
+REPLAYED_EVENTS = ("search", "context", "token")
+SCRAPE_CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", 10))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", 4))
+SCRAPE_DEADLINE = float(os.environ.get("SCRAPE_DEADLINE", 8))
+SCRAPE_ENOUGH_PAGES = int(os.environ.get("SCRAPE_ENOUGH_PAGES", 6)) or None
+SCRAPE_ENOUGH_CHUNKS = int(os.environ.get("SCRAPE_ENOUGH_CHUNKS", 0)) or None
+PROGRESSIVE_CONTEXT = os.environ.get("PROGRESSIVE_CONTEXT", "false") == "true"
+PROGRESSIVE_MIN_CHUNKS = int(os.environ.get("PROGRESSIVE_MIN_CHUNKS", 5))
+PROGRESSIVE_SIMILARITY_FLOOR = float(
+    os.environ.get("PROGRESSIVE_SIMILARITY_FLOOR", 0.75)
+)
+EMBED_MAX_WAIT = float(os.environ.get("EMBED_MAX_WAIT", 0.005))
+EMBED_MAX_BATCH_SIZE = int(os.environ.get("EMBED_MAX_BATCH_SIZE", 256))
+EMBED_MAX_TOKENS = int(os.environ.get("EMBED_MAX_TOKENS", 8000))
+REQUIRED_WARMUP = ("redis", "chunk_index", "answer_index")
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "gpt-3.5-turbo")
+CHAT_BUFFER_SIZE = int(os.environ.get("CHAT_BUFFER_SIZE", 64))
+CHUNK_LENGTH = os.environ.get("CHUNK_LENGTH", "chars")
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 400))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", 50))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
 
 
-async def event_generator(query) -> AsyncGenerator[dict, None]:
-    redis = RedisVectorCache(host="cache", port=6379)
-    embeddings = OpenAIEmbeddings()
-    google = GoogleAPI()
-    scraper = ScraperLocal()
-    splitter = LangChainSplitter(chunk_size=400, chunk_overlap=50, length_function=len)
+def build_redis() -> aioredis.Redis:
+    """Client on one bounded pool for every async Redis user: chunk, embedding,
+    search and answer caches. When all connections are busy, callers wait for a
+    free one."""
+
+    pool = aioredis.BlockingConnectionPool(
+        host="cache",
+        port=6379,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=5,
+        socket_keepalive=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def build_cache(redis_client: aioredis.Redis):
+    if CACHE_BACKEND == "sync":
+        return RedisVectorCache(host="cache", port=6379, settings=INDEX_SETTINGS)
+    return AsyncRedisVectorCache(redis_client, settings=INDEX_SETTINGS)
 
-    # scraper = ScraperRemoteClient()
-    # embeddings = RemoteEmbeddings()
 
-    # redis.init_test()
+async def ensure_chunk_index(cache, vector_dimension: int):
+    if isinstance(cache, AsyncRedisVectorCache):
+        created = await cache.ensure_index(vector_dimension)
+    else:
+        created = cache.ensure_index(vector_dimension)
+    if created:
+        logger.info(f"Created index with vector dimensions {vector_dimension}")
+
+
+async def warm_http():
+    """Opens a keep-alive connection to the search API ahead of the first query."""
+
+    origin = "{0.scheme}://{0.netloc}/".format(urlsplit(GOOGLE_API_URL))
+    async with http_pool.session().head(origin) as response:
+        await response.release()
+
+
+async def warm(state, name: str):
+    step_start = time.perf_counter()
     try:
-        redis.init_index(vector_dimension=embeddings.vector_dimension)
-        logger.info(
-            f"Created index with vector dimensions {embeddings.vector_dimension}"
-        )
-    except:
-        logger.info("Index already exists.")
-
-    retriever = Retriever(
-        cache=redis,
-        searcher=google,
-        scraper=scraper,
+        await state.warm_steps[name]()
+        seconds = time.perf_counter() - step_start
+        state.warmup[name] = {"ok": True, "seconds": seconds}
+    except Exception as e:
+        logger.warning(f"WARMUP {name} FAILED: {e!r}")
+        state.warmup[name] = {"ok": False, "error": repr(e)}
+
+
+async def rewarm(state):
+    """Retries the required warm-up steps that failed, e.g. on a Redis blip."""
+
+    async with state.warm_lock:
+        for name in REQUIRED_WARMUP:
+            if not state.warmup[name]["ok"]:
+                await warm(state, name)
+        state.ready = all(state.warmup[step]["ok"] for step in REQUIRED_WARMUP)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Builds the request pipeline once per worker and warms it up."""
+
+    start = time.perf_counter()
+    app.state.ready = False
+    app.state.startup_time = None
+    app.state.warmup = {}
+    app.state.warm_lock = asyncio.Lock()
+
+    redis_client = build_redis()
+    batcher = BatchedEmbeddings(
+        OpenAIEmbeddings(),
+        max_wait=EMBED_MAX_WAIT,
+        max_batch_size=EMBED_MAX_BATCH_SIZE,
+        max_tokens=EMBED_MAX_TOKENS,
+        counter=TokenCounter(model=OpenAIEmbeddings.model),
+    )
+    embeddings = CachedEmbeddings(
+        batcher,
+        client=redis_client,
+        max_entries=EMBEDDINGS_CACHE_SIZE,
+        ttl=EMBEDDINGS_CACHE_TTL,
+    )
+    searcher = CachedSearcher(
+        GoogleAPI(),
+        client=redis_client,
+        ttl=SEARCH_CACHE_TTL,
+        max_entries=SEARCH_CACHE_SIZE,
+    )
+    pages = PageCache(ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES)
+    token_counter = TokenCounter(model=CHAT_MODEL)
+    packer = ContextPacker(token_counter, prompt.rag, budget=CONTEXT_TOKEN_BUDGET)
+    answers = AnswerCache(
+        redis_client,
+        threshold=ANSWER_CACHE_TRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        max_entries=ANSWER_CACHE_SIZE,
+    )
+    app.state.embeddings = embeddings
+    app.state.answers = answers
+    app.state.chat = OpenAIChat(
+        model=CHAT_MODEL, temperature=0.0, buffer_size=CHAT_BUFFER_SIZE
+    )
+    app.state.monitored = {
+        "embeddings": embeddings,
+        "batching": batcher,
+        "http": http_pool,
+        "extraction": html_extractor,
+        "pages": pages,
+        "search": searcher,
+        "context": packer,
+    }
+
+    cache = build_cache(redis_client)
+    splitter = RecursiveCharacterSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=token_counter.length if CHUNK_LENGTH == "tokens" else len,
+    )
+    # scraper = ScraperRemote()
+    # embeddings = RemoteEmbeddings()
+    app.state.retriever = Retriever(
+        cache=cache,
+        searcher=searcher,
+        scraper=ScraperLocal(pages=pages),
         embeddings=embeddings,
         splitter=splitter,
+        scrape_concurrency=SCRAPE_CONCURRENCY,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        embed_concurrency=EMBED_CONCURRENCY,
+        scrape_deadline=SCRAPE_DEADLINE,
+        enough_pages=SCRAPE_ENOUGH_PAGES,
+        enough_chunks=SCRAPE_ENOUGH_CHUNKS,
+        progressive=PROGRESSIVE_CONTEXT,
+        min_chunks=PROGRESSIVE_MIN_CHUNKS,
+        similarity_floor=PROGRESSIVE_SIMILARITY_FLOOR,
+        packer=packer,
     )
-    async for event in retriever.get_context(query=query, cache_treshold=0.85, k=10):
+
+    dimension = embeddings.vector_dimension
+    app.state.warm_steps = {
+        "redis": redis_client.ping,
+        "chunk_index": lambda: ensure_chunk_index(cache, dimension),
+        "answer_index": lambda: answers.ensure_index(dimension),
+        "http": warm_http,
+        "extractor": lambda: html_extractor.extract("<p>warm up</p>"),
+        "splitter": lambda: splitter.split("warm up " * 100),
+        "tokenizer": lambda: asyncio.to_thread(token_counter.length, "warm up"),
+        "embedding_tokenizer": lambda: asyncio.to_thread(
+            batcher.counter.length, "warm up"  # type: ignore
+        ),
+    }
+    for name in app.state.warm_steps:
+        await warm(app.state, name)
+
+    app.state.ready = all(app.state.warmup[step]["ok"] for step in REQUIRED_WARMUP)
+    app.state.startup_time = time.perf_counter() - start
+    logger.info(f"STARTUP TIME: {app.state.startup_time}")
+
+    yield
+
+    await http_pool.close()
+    html_extractor.close()
+    await redis_client.close()
+    await redis_client.connection_pool.disconnect()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def degradation(event: dict) -> Optional[str]:
+    """Why an event shows that retrieval fell short, if it does."""
+
+    if event["event"] == "search" and json.loads(event["data"]).get("fallback"):
+        return "search fallback"
+    if event["event"] == "scrape":
+        if not ScrapeReport.model_validate_json(event["data"]).used:
+            return "no page used"
+    if event["event"] == "context" and not event["data"].strip():
+        return "empty context"
+    return None
+
+
+async def event_generator(
+    query,
+    state,
+    search_cache: bool = True,
+    answer_cache: bool = True,
+) -> AsyncGenerator[dict, None]:
+    start = time.perf_counter()
+    retriever: Retriever = state.retriever
+    answers: AnswerCache = state.answers
+    query_vector = (await state.embeddings.run([query]))[0]
+    # Without answer_cache the answer is generated afresh, then cached again.
+    cached = await answers.find(query_vector) if answer_cache else None
+    if cached:
+        logger.info(f"ANSWER CACHE HIT: {cached['similarity']}")
+        hit = {
+            "hit": True,
+            "query": cached["query"],
+            "similarity": cached["similarity"],
+        }
+        yield {"event": "cache", "data": json.dumps(hit)}
+        for event in cached["events"]:
+            yield event
+        return
+
+    recorded = []
+    degraded = None
+    async for event in retriever.get_context(
+        query=query, cache_treshold=0.85, k=10, search_cache=search_cache
+    ):
+        recorded.append(event)
         yield event
+        degraded = degraded or degradation(event)
         if event["event"] == "context":
             final_prompt = prompt.rag.format(context=event["data"], question=query)
 
             yield {"event": "prompt", "data": final_prompt}
 
-            for text in stream_chat(prompt=final_prompt):
+            async for text in state.chat.stream(final_prompt):
+                if recorded[-1]["event"] != "token":
+                    logger.info(f"TIME TO FIRST TOKEN: {time.perf_counter() - start}")
+                recorded.append({"event": "token", "data": text})
                 yield {"event": "token", "data": text}
 
+    # An answer from degraded retrieval must not be replayed to similar queries.
+    if degraded:
+        logger.info(f"ANSWER NOT CACHED: {degraded}")
+        return
+    await answers.write(
+        query,
+        query_vector,
+        [event for event in recorded if event["event"] in REPLAYED_EVENTS],
+    )
+
+
+@app.get("/stats")
+async def stats(request: Request) -> dict:
+    monitored = request.app.state.monitored
+    return {name: component.stats() for name, component in monitored.items()}
+
+
+@app.get("/health")
+async def health() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready(request: Request) -> JSONResponse:
+    state = request.app.state
+    if not state.ready:
+        await rewarm(state)
+    body = {
+        "ready": state.ready,
+        "startup_time": state.startup_time,
+        "warmup": state.warmup,
+    }
+    return JSONResponse(body, status_code=200 if state.ready else 503)
+
 
 @app.get("/streamingSearch")
-async def main(query: str) -> EventSourceResponse:
-    return EventSourceResponse(event_generator(query))
+async def main(
+    query: str,
+    request: Request,
+    search_cache: bool = True,
+    answer_cache: bool = True,
+) -> EventSourceResponse:
+    return EventSourceResponse(
+        event_generator(query, request.app.state, search_cache, answer_cache)
+    )
 
 
 if __name__ == "__main__":
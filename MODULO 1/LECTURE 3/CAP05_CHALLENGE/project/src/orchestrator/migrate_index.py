@@ -0,0 +1,23 @@
+"""Rebuilds idx:chunks_vss with the index settings from the environment.
+
+Run inside the orchestrator container, e.g. after switching to HNSW:
+
+    VECTOR_INDEX_ALGORITHM=HNSW python migrate_index.py
+
+Switching VECTOR_INDEX_STORAGE rewrites every chunk into the new layout. Set the
+same value for the orchestrator afterwards, it refuses to start on an index of
+the other layout.
+"""
+from util import logger
+from config import INDEX_SETTINGS
+from retrieval.cache import RedisVectorCache
+from retrieval.embeddings import OpenAIEmbeddings
+
+
+if __name__ == "__main__":
+    redis = RedisVectorCache(host="cache", port=6379)
+    target = redis.migrate_index(
+        vector_dimension=OpenAIEmbeddings.vector_dimension, settings=INDEX_SETTINGS
+    )
+    logger.info(f"idx:chunks_vss now points at {target}")
+    print(target)
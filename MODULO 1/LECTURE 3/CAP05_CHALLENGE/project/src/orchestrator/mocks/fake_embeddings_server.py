@@ -0,0 +1,50 @@
+"""Local stand-in for the embeddings service, compatible with RemoteEmbeddings.
+
+Vectors are derived from the text hash, so they are stable across calls. Each
+request sleeps `latency + per_text * len(texts)` to mimic an upstream model.
+
+    uvicorn mocks.fake_embeddings_server:app --port 8100
+"""
+import asyncio
+import hashlib
+import os
+
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+DIMENSION = int(os.environ.get("FAKE_EMBEDDINGS_DIMENSION", 384))
+LATENCY = float(os.environ.get("FAKE_EMBEDDINGS_LATENCY", 0.05))
+PER_TEXT = float(os.environ.get("FAKE_EMBEDDINGS_PER_TEXT", 0.0005))
+
+app = FastAPI()
+calls = {"requests": 0, "texts": 0}
+
+
+class EncodeRequest(BaseModel):
+    text: list[str]
+
+
+def fake_vector(text: str) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(DIMENSION)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.post("/encode")
+async def encode(request: EncodeRequest) -> dict:
+    calls["requests"] += 1
+    calls["texts"] += len(request.text)
+    await asyncio.sleep(LATENCY + PER_TEXT * len(request.text))
+    return {"embedding": [fake_vector(text) for text in request.text]}
+
+
+@app.get("/stats")
+async def stats() -> dict:
+    return calls
+
+
+@app.post("/reset")
+async def reset() -> dict:
+    calls.update(requests=0, texts=0)
+    return calls
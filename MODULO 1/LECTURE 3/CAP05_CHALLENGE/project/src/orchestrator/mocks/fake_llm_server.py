@@ -0,0 +1,56 @@
+"""Local OpenAI-compatible streaming chat server for tests and benchmarks.
+
+Streams TOKENS tokens, one every TOKEN_DELAY seconds, in the same SSE format
+as /v1/chat/completions. Point the openai client at it with
+OPENAI_API_BASE=http://localhost:8200/v1.
+
+    uvicorn mocks.fake_llm_server:app --port 8200
+"""
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+TOKENS = int(os.environ.get("FAKE_LLM_TOKENS", 200))
+TOKEN_DELAY = float(os.environ.get("FAKE_LLM_TOKEN_DELAY", 0.01))
+
+app = FastAPI()
+streams = {"started": 0, "finished": 0, "cancelled": 0}
+
+
+def chunk(delta: dict, finish_reason=None) -> str:
+    body = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "model": "fake",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def completions(request: Request) -> StreamingResponse:
+    await request.json()
+
+    async def tokens():
+        streams["started"] += 1
+        try:
+            yield chunk({"role": "assistant"})
+            for i in range(TOKENS):
+                await asyncio.sleep(TOKEN_DELAY)
+                yield chunk({"content": f"token{i} "})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+            streams["finished"] += 1
+        except asyncio.CancelledError:
+            streams["cancelled"] += 1
+            raise
+
+    return StreamingResponse(tokens(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats() -> dict:
+    return streams
@@ -0,0 +1,27 @@
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+
+class VectorIndexSettings(BaseModel):
+    storage: Literal["HASH", "JSON"] = "JSON"
+    algorithm: Literal["FLAT", "HNSW"] = "FLAT"
+    m: int = 16
+    ef_construction: int = 200
+    ef_runtime: int = 10
+    initial_cap: Optional[int] = None
+
+    def attributes(self, vector_dimension: int) -> dict:
+        """Vector field attributes for FT.CREATE."""
+
+        attributes = {
+            "TYPE": "FLOAT32",
+            "DIM": vector_dimension,
+            "DISTANCE_METRIC": "COSINE",
+        }
+        if self.initial_cap is not None:
+            attributes["INITIAL_CAP"] = self.initial_cap
+        if self.algorithm == "HNSW":
+            attributes["M"] = self.m
+            attributes["EF_CONSTRUCTION"] = self.ef_construction
+            attributes["EF_RUNTIME"] = self.ef_runtime
+        return attributes
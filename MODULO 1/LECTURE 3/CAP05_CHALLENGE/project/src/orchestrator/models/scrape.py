@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class ScrapeReport(BaseModel):
+    used: list[str] = []
+    cut_off: list[str] = []
+    failed: dict[str, str] = {}
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class CSEThumbnail(BaseModel):
@@ -22,3 +22,5 @@ class SearchDoc(BaseModel):
 
 class SearchResult(BaseModel):
     items: list[SearchDoc]
+    # Set on the canned result served when the search API failed; never dumped.
+    fallback: bool = Field(default=False, exclude=True)
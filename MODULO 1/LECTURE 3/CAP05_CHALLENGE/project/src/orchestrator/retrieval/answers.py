@@ -0,0 +1,109 @@
+import hashlib
+import json
+import time
+from typing import Optional
+import numpy as np
+from redis.commands.search.field import TextField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+from redis.exceptions import ResponseError
+
+ANSWER_INDEX_NAME = "idx:answers_vss"
+ANSWER_PREFIX = "answers:"
+ANSWER_LRU_KEY = "lru:answers"
+
+
+class AnswerCache:
+    """Semantic cache of finished answers, keyed by the query embedding.
+
+    Answers live in their own vector index next to the chunk cache. A query
+    whose embedding is at least `threshold` similar to a cached one gets the
+    stored events back instead of running the pipeline and the LLM. The number
+    of answers is capped at max_entries, oldest written first out.
+    """
+
+    def __init__(
+        self,
+        client,
+        threshold: float = 0.95,
+        ttl: int = 3600,
+        max_entries: int = 1000,
+    ) -> None:
+        self.client = client
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    async def find(self, vector: list[float]) -> Optional[dict]:
+        """Returns the closest cached answer above the threshold, if any."""
+
+        result = await self.client.ft(ANSWER_INDEX_NAME).search(
+            Query("(*)=>[KNN 1 @vector $query_vector AS vector_score]")
+            .sort_by("vector_score")
+            .return_fields("vector_score", "query", "events")
+            .dialect(2),
+            {"query_vector": np.array(vector, dtype=np.float32).tobytes()},
+        )
+        if not result.docs:  # type: ignore
+            return None
+        doc = result.docs[0]  # type: ignore
+        similarity = 1 - float(doc.vector_score)
+        if similarity < self.threshold:
+            return None
+        return {
+            "query": doc.query,
+            "similarity": similarity,
+            "events": json.loads(doc.events),
+        }
+
+    async def write(self, query: str, vector: list[float], events: list[dict]):
+        digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        key = f"{ANSWER_PREFIX}{digest}"
+        async with self.client.pipeline(transaction=False) as pipeline:
+            pipeline.hset(
+                key,
+                mapping={
+                    "query": query,
+                    "vector": np.array(vector, dtype=np.float32).tobytes(),
+                    "events": json.dumps(events),
+                },
+            )
+            pipeline.expire(key, self.ttl)
+            pipeline.zadd(ANSWER_LRU_KEY, {key: time.time()})
+            # Forget entries that already expired on their own.
+            pipeline.zremrangebyscore(ANSWER_LRU_KEY, "-inf", time.time() - self.ttl)
+            pipeline.zcard(ANSWER_LRU_KEY)
+            *_, size = await pipeline.execute()
+
+        if size > self.max_entries:
+            evicted = await self.client.zpopmin(ANSWER_LRU_KEY, size - self.max_entries)
+            if evicted:
+                await self.client.delete(*[member for member, _ in evicted])
+
+    async def init_index(self, vector_dimension):
+        schema = (
+            TextField("query", no_stem=True),
+            VectorField(
+                "vector",
+                "FLAT",
+                {
+                    "TYPE": "FLOAT32",
+                    "DIM": vector_dimension,
+                    "DISTANCE_METRIC": "COSINE",
+                },
+            ),
+        )
+        definition = IndexDefinition(
+            prefix=[ANSWER_PREFIX], index_type=IndexType.HASH
+        )
+        await self.client.ft(ANSWER_INDEX_NAME).create_index(
+            fields=schema, definition=definition
+        )
+
+    async def ensure_index(self, vector_dimension) -> bool:
+        try:
+            await self.client.ft(ANSWER_INDEX_NAME).info()
+            return False
+        except ResponseError:
+            await self.init_index(vector_dimension)
+            return True
@@ -1,37 +1,299 @@
 from abc import ABC, abstractmethod
 import hashlib
 import json
+import time
+from typing import Optional
 import numpy as np
 import pandas as pd
 import redis
+import redis.asyncio as aioredis
 from redis.commands.search.field import (
     TextField,
     VectorField,
 )
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
+from redis.exceptions import ResponseError
 from models.document import Document
+from models.index import VectorIndexSettings
+from retrieval.similarity import normalize
 
 VECTOR_DIMENSION = 1536
+INDEX_NAME = "idx:chunks_vss"
+REDIS_TYPES = {"HASH": "hash", "JSON": "ReJSON-RL"}
+DUPLICATE_SIMILARITY = 0.97
+CHUNK_TTL = 3600
 
 
 class VectorDbCache(ABC):
     @abstractmethod
-    async def find_similar(self, vector: list[float], k=10) -> list[Document]:
+    async def find_similar(
+        self, vector: list[float], k=10, with_vectors=False
+    ) -> list[Document]:
         pass
 
+    @abstractmethod
+    async def find_exact(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """Stored vectors of the texts already cached, None for the others."""
+
     @abstractmethod
     async def write(self, documents: list[Document]):
-        pass
+        """Stores the documents that are not duplicates of cached chunks."""
+
+
+def chunk_key(text: str) -> str:
+    """Content-addressed key, the same text always maps to the same chunk."""
+
+    return f"chunks:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def unique_by_key(documents: list[Document]) -> dict[str, Document]:
+    """Keeps the first document of every exact duplicate in the batch."""
+
+    unique: dict[str, Document] = {}
+    for document in documents:
+        unique.setdefault(chunk_key(document.text), document)
+    return unique
+
+
+def read_vectors(pipeline, texts: list[str], storage: str):
+    for text in texts:
+        if storage == "JSON":
+            pipeline.execute_command("JSON.GET", chunk_key(text), "$.vector")
+        else:
+            pipeline.hget(chunk_key(text), "vector")
+
+
+def parse_vector(reply, storage: str) -> Optional[list[float]]:
+    # Keys left over from another storage layout answer with WRONGTYPE.
+    if reply is None or isinstance(reply, Exception):
+        return None
+    if storage == "JSON":
+        return json.loads(reply)[0]
+    return np.frombuffer(reply, dtype=np.float32).tolist()
+
+
+def knn_query(
+    k: int, ef_runtime: Optional[int] = None, with_vectors: bool = False
+) -> Query:
+    ef = f" EF_RUNTIME {ef_runtime}" if ef_runtime else ""
+    fields = ["vector_score", "text", "url"] + (["vector"] if with_vectors else [])
+    return (
+        Query(f"(*)=>[KNN {k} @vector $query_vector{ef} AS vector_score]")
+        .sort_by("vector_score")
+        .return_fields(*fields)
+        .dialect(2)
+    )
+
+
+def to_documents(chunks, vectors: Optional[list] = None) -> list[Document]:
+    """Builds documents from search results.
+
+    JSON chunks carry their vector in the result when it was requested. HASH
+    vectors are binary, so they are fetched apart and passed in as raw bytes.
+    """
+
+    documents = []
+    for i, doc in enumerate(chunks):
+        if vectors is not None:
+            vector = np.frombuffer(vectors[i], dtype=np.float32).tolist()
+        elif hasattr(doc, "vector"):
+            vector = json.loads(doc.vector)
+        else:
+            vector = None
+        documents.append(
+            Document(
+                url=doc.url,
+                text=doc.text,
+                vector=vector,
+                similarity=1 - float(doc.vector_score),
+            )
+        )
+    return documents
+
+
+def index_schema(
+    vector_dimension: int, settings: Optional[VectorIndexSettings] = None
+) -> tuple:
+    settings = settings or VectorIndexSettings()
+    path = "$." if settings.storage == "JSON" else ""
+    return (
+        TextField(f"{path}text", no_stem=True, as_name="text"),
+        TextField(f"{path}url", no_stem=True, as_name="url"),
+        VectorField(
+            f"{path}vector",
+            settings.algorithm,
+            settings.attributes(vector_dimension),
+            as_name="vector",
+        ),
+    )
+
+
+def index_definition(
+    settings: Optional[VectorIndexSettings] = None, prefix: str = "chunks:"
+) -> IndexDefinition:
+    settings = settings or VectorIndexSettings()
+    index_type = IndexType.JSON if settings.storage == "JSON" else IndexType.HASH
+    return IndexDefinition(prefix=[prefix], index_type=index_type)
+
+
+def decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def index_storage(info: dict) -> str:
+    """Storage layout, HASH or JSON, of an index from its FT.INFO reply."""
+
+    info = {decode(key): value for key, value in info.items()}
+    definition = [decode(item) for item in info["index_definition"]]
+    return dict(zip(definition[::2], definition[1::2]))["key_type"]
+
+
+def check_storage(info: dict, settings: VectorIndexSettings):
+    storage = index_storage(info)
+    if storage != settings.storage:
+        raise RuntimeError(
+            f"{INDEX_NAME} indexes {storage} chunks but the storage setting is "
+            f"{settings.storage}; run migrate_index.py or set "
+            f"VECTOR_INDEX_STORAGE={storage}"
+        )
+
+
+def parse_chunk(reply, storage: str) -> Document:
+    """Document from a JSON.GET $ or HGETALL reply of a chunk."""
+
+    if storage == "JSON":
+        return Document(**{"similarity": -1, **json.loads(reply)[0]})
+    fields = {decode(key): value for key, value in reply.items()}
+    return Document(
+        text=decode(fields["text"]),
+        url=decode(fields["url"]),
+        vector=np.frombuffer(fields["vector"], dtype=np.float32).tolist(),
+        similarity=-1,
+    )
+
+
+def store_chunk(pipeline, redis_key: str, document: Document, storage: str):
+    """Queues the write of one chunk in the given storage layout."""
+
+    if storage == "JSON":
+        pipeline.execute_command(
+            "JSON.SET", redis_key, "$", json.dumps(document.model_dump())
+        )
+    else:
+        pipeline.hset(
+            redis_key,
+            mapping={
+                "text": document.text,
+                "url": document.url,
+                "vector": np.array(document.vector, dtype=np.float32).tobytes(),
+            },
+        )
+
+
+def queue_probes(pipeline, vectors: list[list[float]]):
+    """Queues one KNN 1 probe per vector, for its closest cached chunk."""
+
+    for vector in vectors:
+        pipeline.execute_command(*knn_probe_args(vector))
+
+
+def knn_probe_args(vector: list[float]) -> tuple:
+    """Raw FT.SEARCH arguments asking only for the score of the nearest chunk."""
+
+    return (
+        "FT.SEARCH",
+        INDEX_NAME,
+        "(*)=>[KNN 1 @vector $query_vector AS vector_score]",
+        "PARAMS",
+        2,
+        "query_vector",
+        np.array(vector, dtype=np.float32).tobytes(),
+        "SORTBY",
+        "vector_score",
+        "RETURN",
+        1,
+        "vector_score",
+        "DIALECT",
+        2,
+    )
+
+
+def parse_nearest_similarity(reply) -> float:
+    """Reads the best score out of a raw KNN 1 FT.SEARCH reply."""
+
+    if not reply or reply[0] == 0:
+        return -1.0
+    fields = reply[2]
+    values = dict(zip(fields[::2], fields[1::2]))
+    score = values.get(b"vector_score", values.get("vector_score"))
+    return 1 - float(score)
+
+
+def drop_batch_duplicates(documents: list[Document]) -> list[Document]:
+    """Keeps the first of every group of near-identical documents in the batch."""
 
+    if len(documents) < 2:
+        return documents
+    vectors = normalize([doc.vector for doc in documents])
+    similarities = vectors @ vectors.T
+    kept: list[int] = []
+    for i in range(len(documents)):
+        if not kept or similarities[i, kept].max() < DUPLICATE_SIMILARITY:
+            kept.append(i)
+    return [documents[i] for i in kept]
 
-SHA256 = hashlib.sha256()
+
+def knn_params(vector: list[float]) -> dict:
+    return {"query_vector": np.array(vector, dtype=np.float32).tobytes()}
+
+
+def queue_hash_vectors(pipeline, chunks):
+    """Queues the reads of HASH vectors, which KNN results cannot carry."""
+
+    for chunk in chunks:
+        pipeline.hget(chunk.id, "vector")
+
+
+def queue_exists(pipeline, keys):
+    for redis_key in keys:
+        pipeline.exists(redis_key)
+
+
+def not_held(unique: dict[str, Document], held: list) -> list[Document]:
+    return [doc for doc, h in zip(unique.values(), held) if not h]
+
+
+def keep_unseen(documents: list[Document], nearest: list[float]) -> list[Document]:
+    """Drops documents that are duplicates of the cache or of each other.
+
+    Exact copies are found by key with a single EXISTS pipeline beforehand, so
+    only new texts pay for the KNN near-duplicate probe that gives nearest.
+    """
+
+    unseen = [
+        document
+        for document, similarity in zip(documents, nearest)
+        if similarity < DUPLICATE_SIMILARITY
+    ]
+    return drop_batch_duplicates(unseen)
+
+
+def queue_writes(pipeline, documents: list[Document], storage: str):
+    for document in documents:
+        redis_key = chunk_key(document.text)
+        document.similarity = -1
+        store_chunk(pipeline, redis_key, document, storage)
+        pipeline.expire(redis_key, CHUNK_TTL)
 
 
 class RedisVectorCache(VectorDbCache):
     _pool = None
 
-    def __init__(self, host, port) -> None:
+    def __init__(
+        self, host, port, settings: Optional[VectorIndexSettings] = None
+    ) -> None:
+        self.settings = settings or VectorIndexSettings()
         if RedisVectorCache._pool is None:
             RedisVectorCache._pool = redis.ConnectionPool(host=host, port=port)
 
@@ -39,51 +301,49 @@ class RedisVectorCache(VectorDbCache):
             connection_pool=RedisVectorCache._pool, decode_responses=True
         )
 
-    async def find_similar(self, vector: list[float], k=10) -> list[Document]:
+    async def find_similar(
+        self, vector: list[float], k=10, with_vectors=False
+    ) -> list[Document]:
+        in_result = with_vectors and self.settings.storage == "JSON"
         chunks = (
-            self.client.ft("idx:chunks_vss")
-            .search(
-                Query(f"(*)=>[KNN {k} @vector $query_vector AS vector_score]")
-                .sort_by("vector_score")
-                .return_fields("vector_score", "text", "url", "vector")
-                .dialect(2),
-                {"query_vector": np.array(vector, dtype=np.float32).tobytes()},
-            )
+            self.client.ft(INDEX_NAME)
+            .search(knn_query(k, with_vectors=in_result), knn_params(vector))
             .docs  # type: ignore
         )
-        documents = map(
-            lambda doc: Document(
-                url=doc.url,
-                text=doc.text,
-                vector=json.loads(doc.vector),
-                similarity=1 - float(doc.vector_score),
-            ),
-            chunks,
-        )
+        vectors = None
+        if with_vectors and not in_result:
+            pipeline = self.client.pipeline(transaction=False)
+            queue_hash_vectors(pipeline, chunks)
+            vectors = pipeline.execute()
+        return to_documents(chunks, vectors)
 
-        return list(documents)
+    async def find_exact(self, texts: list[str]) -> list[Optional[list[float]]]:
+        pipeline = self.client.pipeline(transaction=False)
+        read_vectors(pipeline, texts, self.settings.storage)
+        replies = pipeline.execute(raise_on_error=False)
+        return [parse_vector(reply, self.settings.storage) for reply in replies]
 
     async def get_insertables(self, documents: list[Document]) -> list[Document]:
-        insertables = []
-        for document in documents:
-            results = await self.find_similar(document.vector, k=1)
-            if not results:
-                insertables.append(document)
-            elif results[0].similarity < 0.97:
-                insertables.append(document)
-        return insertables
+        unique = unique_by_key(documents)
+        pipeline = self.client.pipeline(transaction=False)
+        queue_exists(pipeline, unique)
+        documents = not_held(unique, pipeline.execute() if unique else [])
+        if not documents:
+            return []
+        nearest = self.nearest_similarities([doc.vector for doc in documents])
+        return keep_unseen(documents, nearest)
+
+    def nearest_similarities(self, vectors: list[list[float]]) -> list[float]:
+        """Similarity of each vector to its closest cached chunk, in one round trip."""
+
+        pipeline = self.client.pipeline(transaction=False)
+        queue_probes(pipeline, vectors)
+        return [parse_nearest_similarity(reply) for reply in pipeline.execute()]
 
     async def write(self, documents: list[Document]):
         documents = await self.get_insertables(documents)
         pipeline = self.client.pipeline()
-        for document in documents:
-            SHA256.update(document.text.encode("utf-8"))
-            chunk_id = SHA256.hexdigest()
-            redis_key = f"chunks:{chunk_id}"
-            document.similarity = -1
-            pipeline.json().set(redis_key, "$", document.model_dump())
-            pipeline.expire(redis_key, 3600)
-
+        queue_writes(pipeline, documents, self.settings.storage)
         pipeline.execute()
 
     def init_test(self):
@@ -93,28 +353,205 @@ class RedisVectorCache(VectorDbCache):
 
         pipeline = self.client.pipeline()
         for chunk in chunks:
-            SHA256.update(chunk["text"].encode("utf-8"))
-            chunk_id = SHA256.hexdigest()
-            redis_key = f"chunks:{chunk_id}"
-            pipeline.json().set(redis_key, "$", chunk)
+            redis_key = chunk_key(chunk["text"])
+            document = Document(**{"similarity": -1, **chunk})
+            store_chunk(pipeline, redis_key, document, self.settings.storage)
         pipeline.execute()
 
-    def init_index(self, vector_dimension):
-        schema = (
-            TextField("$.text", no_stem=True, as_name="text"),
-            TextField("$.url", no_stem=True, as_name="url"),
-            VectorField(
-                "$.vector",
-                "FLAT",
-                {
-                    "TYPE": "FLOAT32",
-                    "DIM": vector_dimension,
-                    "DISTANCE_METRIC": "COSINE",
-                },
-                as_name="vector",
-            ),
+    def init_index(
+        self,
+        vector_dimension,
+        settings: Optional[VectorIndexSettings] = None,
+        name: str = INDEX_NAME,
+    ):
+        settings = settings or self.settings
+        self.client.ft(name).create_index(
+            fields=index_schema(vector_dimension, settings),
+            definition=index_definition(settings),
         )
-        definition = IndexDefinition(prefix=["chunks:"], index_type=IndexType.JSON)
-        self.client.ft("idx:chunks_vss").create_index(
-            fields=schema, definition=definition
+
+    def ensure_index(self, vector_dimension) -> bool:
+        """Creates the chunk index unless it exists. Returns whether it did.
+
+        Raises RuntimeError when the existing index uses another storage layout
+        than the settings, since its chunks could not be read or written.
+        """
+
+        try:
+            info = self.client.ft(INDEX_NAME).info()
+        except ResponseError:
+            self.init_index(vector_dimension)
+            return True
+        check_storage(info, self.settings)
+        return False
+
+    def convert_chunks(self, storage: str, batch_size: int = 500) -> int:
+        """Rewrites the chunks of the other layout into storage, keeping TTLs.
+
+        Returns how many chunks were converted.
+        """
+
+        source = "HASH" if storage == "JSON" else "JSON"
+        keys = self.client.scan_iter(
+            "chunks:*", count=batch_size, _type=REDIS_TYPES[source]
         )
+        converted = 0
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) == batch_size:
+                converted += self.convert_batch(batch, source, storage)
+                batch = []
+        if batch:
+            converted += self.convert_batch(batch, source, storage)
+        return converted
+
+    def convert_batch(self, keys: list, source: str, storage: str) -> int:
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            if source == "JSON":
+                pipeline.execute_command("JSON.GET", key, "$")
+            else:
+                pipeline.hgetall(key)
+            pipeline.pttl(key)
+        replies = pipeline.execute()
+
+        pipeline = self.client.pipeline(transaction=True)
+        converted = 0
+        for key, reply, ttl in zip(keys, replies[::2], replies[1::2]):
+            # Chunks that expired since the scan are gone, not converted.
+            if not reply or ttl == -2:
+                continue
+            pipeline.delete(key)
+            store_chunk(pipeline, key, parse_chunk(reply, source), storage)
+            if ttl > 0:
+                pipeline.pexpire(key, ttl)
+            converted += 1
+        pipeline.execute()
+        return converted
+
+    def migrate_index(
+        self,
+        vector_dimension,
+        settings: VectorIndexSettings,
+        poll_interval: float = 1.0,
+    ) -> str:
+        """Rebuilds the chunk index with new settings while it keeps serving.
+
+        A new index is built in the background over the same "chunks:" keys.
+        Once it has indexed everything, INDEX_NAME is atomically pointed at it
+        through an alias and the old index is dropped. Documents are kept.
+        When the storage layout changes, every chunk is rewritten into the new
+        layout with its TTL kept; until the alias moves, the old index no
+        longer finds the chunks already rewritten.
+        """
+
+        info = self.index_info()
+        current = info["index_name"]
+        target = f"{INDEX_NAME}:{settings.algorithm.lower()}:{int(time.time())}"
+        self.init_index(vector_dimension, settings, name=target)
+        if index_storage(info) != settings.storage:
+            self.convert_chunks(settings.storage)
+
+        while float(self.index_info(target)["percent_indexed"]) < 1:
+            time.sleep(poll_interval)
+
+        pipeline = self.client.pipeline(transaction=True)
+        if current == INDEX_NAME:
+            pipeline.execute_command("FT.DROPINDEX", current)
+            pipeline.execute_command("FT.ALIASADD", INDEX_NAME, target)
+        else:
+            pipeline.execute_command("FT.ALIASUPDATE", INDEX_NAME, target)
+            pipeline.execute_command("FT.DROPINDEX", current)
+        pipeline.execute()
+        return target
+
+    def index_info(self, name: str = INDEX_NAME) -> dict:
+        info = self.client.ft(name).info()
+        return {decode(key): decode(value) for key, value in info.items()}
+
+
+class AsyncRedisVectorCache(VectorDbCache):
+    """Non-blocking Redis cache built on redis.asyncio.
+
+    It runs on the client it is given, so it shares that client's connection
+    pool, and its limits, with every other Redis user of the process.
+    """
+
+    def __init__(
+        self, client: aioredis.Redis, settings: Optional[VectorIndexSettings] = None
+    ) -> None:
+        self.settings = settings or VectorIndexSettings()
+        self.client = client
+
+    async def find_similar(
+        self, vector: list[float], k=10, with_vectors=False
+    ) -> list[Document]:
+        in_result = with_vectors and self.settings.storage == "JSON"
+        result = await self.client.ft(INDEX_NAME).search(
+            knn_query(k, with_vectors=in_result), knn_params(vector)
+        )
+        chunks = result.docs  # type: ignore
+        vectors = None
+        if with_vectors and not in_result:
+            async with self.client.pipeline(transaction=False) as pipeline:
+                queue_hash_vectors(pipeline, chunks)
+                vectors = await pipeline.execute()
+        return to_documents(chunks, vectors)
+
+    async def find_exact(self, texts: list[str]) -> list[Optional[list[float]]]:
+        if not texts:
+            return []
+        async with self.client.pipeline(transaction=False) as pipeline:
+            read_vectors(pipeline, texts, self.settings.storage)
+            replies = await pipeline.execute(raise_on_error=False)
+        return [parse_vector(reply, self.settings.storage) for reply in replies]
+
+    async def get_insertables(self, documents: list[Document]) -> list[Document]:
+        unique = unique_by_key(documents)
+        if not unique:
+            return []
+        async with self.client.pipeline(transaction=False) as pipeline:
+            queue_exists(pipeline, unique)
+            documents = not_held(unique, await pipeline.execute())
+        if not documents:
+            return []
+        nearest = await self.nearest_similarities([doc.vector for doc in documents])
+        return keep_unseen(documents, nearest)
+
+    async def nearest_similarities(self, vectors: list[list[float]]) -> list[float]:
+        async with self.client.pipeline(transaction=False) as pipeline:
+            queue_probes(pipeline, vectors)
+            replies = await pipeline.execute()
+        return [parse_nearest_similarity(reply) for reply in replies]
+
+    async def write(self, documents: list[Document]):
+        documents = await self.get_insertables(documents)
+        if not documents:
+            return
+        async with self.client.pipeline(transaction=False) as pipeline:
+            queue_writes(pipeline, documents, self.settings.storage)
+            await pipeline.execute()
+
+    async def init_index(
+        self,
+        vector_dimension,
+        settings: Optional[VectorIndexSettings] = None,
+        name: str = INDEX_NAME,
+    ):
+        settings = settings or self.settings
+        await self.client.ft(name).create_index(
+            fields=index_schema(vector_dimension, settings),
+            definition=index_definition(settings),
+        )
+
+    async def ensure_index(self, vector_dimension) -> bool:
+        """Awaitable RedisVectorCache.ensure_index."""
+
+        try:
+            info = await self.client.ft(INDEX_NAME).info()
+        except ResponseError:
+            await self.init_index(vector_dimension)
+            return True
+        check_storage(info, self.settings)
+        return False
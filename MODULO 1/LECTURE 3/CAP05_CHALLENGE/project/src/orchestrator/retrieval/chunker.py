@@ -0,0 +1,138 @@
+import re
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence
+
+from retrieval.splitter import Splitter
+
+SEPARATORS = ("\n\n", "\n", " ", "")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+class RecursiveCharacterSplitter(Splitter):
+    """Recursive character splitter working on offsets into the page text.
+
+    Produces the same chunks as LangChain's RecursiveCharacterTextSplitter with
+    keep_separator=True and strip_whitespace=True: the first separator found
+    in a span splits it, each separator stays at the start of the piece that
+    follows it, pieces too long for chunk_size are split again with the next
+    separators, and the rest are merged back up to chunk_size with up to
+    chunk_overlap of the previous chunk repeated. Pieces are (start, end)
+    pairs, so only the emitted chunks are copied out of the text.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 400,
+        chunk_overlap: int = 50,
+        length_function: Callable[[str], int] = len,
+        separators: Sequence[str] = SEPARATORS,
+    ) -> None:
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"chunk_overlap ({chunk_overlap}) is larger than "
+                f"chunk_size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = [
+            (separator, re.compile(re.escape(separator)) if separator else None)
+            for separator in separators
+        ]
+
+    async def split(self, text: str) -> list[str]:
+        return [chunk.text for chunk in self.chunks(text)]
+
+    def chunks(self, text: str) -> Iterator[Chunk]:
+        """Lazily yields the chunks of text with their offsets."""
+
+        yield from self.split_span(text, 0, len(text), self.separators)
+
+    def length(self, text: str, start: int, end: int) -> int:
+        if self.length_function is len:
+            return end - start
+        return self.length_function(text[start:end])
+
+    def split_span(
+        self, text: str, start: int, end: int, separators
+    ) -> Iterator[Chunk]:
+        pattern, remaining = separators[-1][1], []
+        for i, (separator, compiled) in enumerate(separators):
+            if not separator:
+                pattern = None
+                break
+            if compiled.search(text, start, end):
+                pattern, remaining = compiled, separators[i + 1 :]
+                break
+
+        good: list[tuple[int, int]] = []
+        for piece in self.pieces(text, start, end, pattern):
+            if self.length(text, *piece) < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                yield from self.merge(text, good)
+                good = []
+            if remaining:
+                yield from self.split_span(text, *piece, remaining)
+            else:
+                # Like LangChain, a piece nothing can split further is kept
+                # as is, without stripping.
+                yield Chunk(text[piece[0] : piece[1]], *piece)
+        if good:
+            yield from self.merge(text, good)
+
+    def pieces(
+        self, text: str, start: int, end: int, pattern
+    ) -> Iterator[tuple[int, int]]:
+        """Splits a span before every separator match, dropping empty pieces."""
+
+        if pattern is None:
+            for i in range(start, end):
+                yield i, i + 1
+            return
+        previous = start
+        for match in pattern.finditer(text, start, end):
+            if match.start() > previous:
+                yield previous, match.start()
+            previous = match.start()
+        if end > previous:
+            yield previous, end
+
+    def merge(self, text: str, pieces: list[tuple[int, int]]) -> Iterator[Chunk]:
+        """Merges adjacent pieces into chunks of at most chunk_size."""
+
+        current: list[tuple[int, int]] = []
+        lengths: list[int] = []
+        total = 0
+        for piece in pieces:
+            length = self.length(text, *piece)
+            if total + length > self.chunk_size and current:
+                chunk = self.strip(text, current[0][0], current[-1][1])
+                if chunk is not None:
+                    yield chunk
+                while total > self.chunk_overlap or (
+                    total + length > self.chunk_size and total > 0
+                ):
+                    total -= lengths.pop(0)
+                    current.pop(0)
+            current.append(piece)
+            lengths.append(length)
+            total += length
+        if current:
+            chunk = self.strip(text, current[0][0], current[-1][1])
+            if chunk is not None:
+                yield chunk
+
+    @staticmethod
+    def strip(text: str, start: int, end: int) -> Optional[Chunk]:
+        span = text[start:end]
+        stripped = span.strip()
+        if not stripped:
+            return None
+        start += len(span) - len(span.lstrip())
+        return Chunk(stripped, start, start + len(stripped))
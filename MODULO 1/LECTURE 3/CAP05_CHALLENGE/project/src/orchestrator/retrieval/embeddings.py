@@ -1,8 +1,14 @@
 from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import hashlib
 import json
-import aiohttp
+from typing import Optional
+import numpy as np
 
 import openai
+from retrieval.tokens import TokenCounter
+from util.http import HttpPool, http_pool
 
 
 class Embeddings(ABC):
@@ -17,16 +23,24 @@ class RemoteEmbeddings(Embeddings):
     """Instanciates a client that implements _embeddings service."""
 
     vector_dimension = 384
+    model = "remote"
+
+    def __init__(
+        self, url: str = "http://embeddings/encode", http: HttpPool = http_pool
+    ) -> None:
+        self.url = url
+        self.http = http
 
     async def run(self, chunks: list[str]) -> list[list[float]]:
-        url = f"http://embeddings/encode"
+        url = self.url
         headers = {"Content-Type": "application/json"}
         payload = json.dumps({"text": chunks})
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=payload, headers=headers) as response:
-                if response.status == 200:
-                    r = await response.json()
-                    return r["embedding"]
+        async with self.http.session().post(
+            url, data=payload, headers=headers
+        ) as response:
+            if response.status == 200:
+                r = await response.json()
+                return r["embedding"]
         return [[]]
 
 
@@ -34,10 +48,237 @@ class OpenAIEmbeddings(Embeddings):
     """OpenAI embeddings client wrapper"""
 
     vector_dimension = 1536
+    model = "text-embedding-ada-002"
 
-    async def run(
-        self, chunks: list[str], model="text-embedding-ada-002"
-    ) -> list[list[float]]:
-        response = await openai.Embedding.acreate(input=chunks, model=model)
+    async def run(self, chunks: list[str], model=None) -> list[list[float]]:
+        response = await openai.Embedding.acreate(
+            input=chunks, model=model or self.model
+        )
         vectors = map(lambda x: x["embedding"], response["data"])  # type: ignore
         return list(vectors)
+
+
+class CachedEmbeddings(Embeddings):
+    """Memoizes any Embeddings client in a process LRU and a shared Redis tier.
+
+    Vectors are keyed by model and the SHA-256 of the exact text, and stored as
+    float64 so the returned values are identical to the wrapped client's.
+    Repeated texts within one call are only embedded once.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        client=None,
+        max_entries: int = 10_000,
+        ttl: int = 86_400,
+    ) -> None:
+        self.embeddings = embeddings
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.vector_dimension = getattr(embeddings, "vector_dimension", None)
+        self.memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.bytes_held = 0
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.calls_saved = 0
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"embeddings:{self.model}:{digest}"
+
+    async def run(self, chunks: list[str]) -> list[list[float]]:
+        if not chunks:
+            return []
+        keys = [self.key(chunk) for chunk in chunks]
+        found: dict[str, np.ndarray] = {}
+        pending: dict[str, str] = {}
+
+        for key, chunk in zip(keys, chunks):
+            if key in found or key in pending:
+                continue
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                found[key] = vector
+            else:
+                pending[key] = chunk
+
+        if pending and self.client is not None:
+            replies = await self.client.mget(list(pending))
+            for key, reply in zip(list(pending), replies):
+                if reply is not None:
+                    self.redis_hits += 1
+                    found[key] = np.frombuffer(reply, dtype=np.float64)
+                    self.remember(key, found[key])
+                    del pending[key]
+
+        if pending:
+            self.misses += len(pending)
+            vectors = await self.embeddings.run(list(pending.values()))
+            # A failed remote call answers [[]]; pad so every text gets a vector.
+            vectors = list(vectors) + [[]] * (len(pending) - len(vectors))
+            fresh = {
+                key: np.array(vector, dtype=np.float64)
+                for key, vector in zip(pending, vectors)
+            }
+            found.update(fresh)
+            # Failed upstream calls come back as empty vectors, never keep those.
+            fresh = {key: vector for key, vector in fresh.items() if vector.size}
+            for key, vector in fresh.items():
+                self.remember(key, vector)
+            await self.share(fresh)
+        else:
+            self.calls_saved += 1
+
+        return [found[key].tolist() for key in keys]
+
+    def remember(self, key: str, vector: np.ndarray):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        self.memory[key] = vector
+        self.bytes_held += vector.nbytes
+        while len(self.memory) > self.max_entries:
+            _, evicted = self.memory.popitem(last=False)
+            self.bytes_held -= evicted.nbytes
+
+    async def share(self, vectors: dict[str, np.ndarray]):
+        if self.client is None or not vectors:
+            return
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key, vector in vectors.items():
+                pipeline.set(key, vector.tobytes(), ex=self.ttl)
+            await pipeline.execute()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        hits = self.memory_hits + self.redis_hits
+        return {
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "entries": len(self.memory),
+            "bytes_held": self.bytes_held,
+            "upstream_calls_saved": self.calls_saved,
+            "texts_saved": hits,
+        }
+
+
+class BatchedEmbeddings(Embeddings):
+    """Merges concurrent run calls into shared upstream requests.
+
+    Texts from every caller are queued and sent together once max_wait seconds
+    have passed since the first one, or as soon as the batch reaches
+    max_batch_size texts or max_tokens tokens, as counted by counter. Each
+    caller then gets its own vectors back, in order. When a shared batch
+    fails, every caller's texts are retried on their own, so only the caller
+    whose input was rejected gets the error.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_wait: float = 0.005,
+        max_batch_size: int = 256,
+        max_tokens: int = 8000,
+        counter: Optional[TokenCounter] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.max_tokens = max_tokens
+        self.counter = counter
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.vector_dimension = getattr(embeddings, "vector_dimension", None)
+        self.queue: list[tuple[str, list, int]] = []
+        self.queued_tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.in_flight: set[asyncio.Task] = set()
+        self.callers = 0
+        self.texts = 0
+        self.upstream_calls = 0
+        self.isolated_retries = 0
+
+    def count_tokens(self, text: str) -> int:
+        if self.counter is not None:
+            return self.counter.count(text)
+        # Roughly four characters per token for English text.
+        return len(text) // 4 + 1
+
+    async def run(self, chunks: list[str]) -> list[list[float]]:
+        if not chunks:
+            return []
+        if not all(chunks):
+            # The API rejects the whole request for a single empty input.
+            raise ValueError("cannot embed an empty text")
+        loop = asyncio.get_running_loop()
+        # Shared by the caller's texts: [future, vectors, texts still missing].
+        waiter = [loop.create_future(), [None] * len(chunks), len(chunks)]
+        self.callers += 1
+        self.texts += len(chunks)
+
+        for i, chunk in enumerate(chunks):
+            tokens = self.count_tokens(chunk)
+            if self.queue and self.queued_tokens + tokens > self.max_tokens:
+                self.flush()
+            self.queue.append((chunk, waiter, i))
+            self.queued_tokens += tokens
+            if len(self.queue) >= self.max_batch_size:
+                self.flush()
+
+        if self.queue and self.timer is None:
+            self.timer = loop.call_later(self.max_wait, self.flush)
+        return await waiter[0]
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.queue:
+            return
+        batch, self.queue, self.queued_tokens = self.queue, [], 0
+        task = asyncio.create_task(self.send(batch))
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def send(self, batch: list[tuple[str, list, int]]):
+        self.upstream_calls += 1
+        try:
+            vectors = await self.embeddings.run([text for text, _, _ in batch])
+        except Exception as e:
+            callers: dict[int, list[tuple[str, list, int]]] = {}
+            for item in batch:
+                callers.setdefault(id(item[1]), []).append(item)
+            if len(callers) > 1:
+                self.isolated_retries += 1
+                await asyncio.gather(*[self.send(items) for items in callers.values()])
+                return
+            for _, waiter, _ in batch:
+                if not waiter[0].done():
+                    waiter[0].set_exception(e)
+            return
+
+        # A failed remote call answers [[]]; pad so every caller still resolves.
+        vectors = list(vectors) + [[]] * (len(batch) - len(vectors))
+        for (_, waiter, i), vector in zip(batch, vectors):
+            waiter[1][i] = vector
+            waiter[2] -= 1
+            if waiter[2] == 0 and not waiter[0].done():
+                waiter[0].set_result(waiter[1])
+
+    def stats(self) -> dict:
+        return {
+            "callers": self.callers,
+            "texts": self.texts,
+            "upstream_calls": self.upstream_calls,
+            "isolated_retries": self.isolated_retries,
+            "mean_batch_size": self.texts / self.upstream_calls
+            if self.upstream_calls
+            else 0.0,
+        }
@@ -0,0 +1,134 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import re
+import signal
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+HTML_EXTRACT_BACKEND = os.environ.get("HTML_EXTRACT_BACKEND", "html.parser")
+HTML_EXTRACT_WORKERS = int(os.environ.get("HTML_EXTRACT_WORKERS", 2))
+HTML_EXTRACT_CPU_LIMIT = float(os.environ.get("HTML_EXTRACT_CPU_LIMIT", 1.0))
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def raise_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def html_to_text(body: str, backend: str = "html.parser") -> str:
+    """Parses all the text from the html.
+
+    "html.parser" and "lxml" go through BeautifulSoup, "selectolax" uses its
+    much faster C parser.
+    """
+
+    if backend == "selectolax":
+        from selectolax.parser import HTMLParser
+
+        tree = HTMLParser(body)
+        tree.strip_tags(["script", "style", "noscript", "template"])
+        root = tree.body or tree.root
+        raw_text = root.text(separator=" ", strip=True) if root else ""
+    else:
+        soup = BeautifulSoup(body, backend)
+        raw_text = soup.get_text(separator=" ", strip=True)
+    return re.sub(r"\n{3,}|\s{2,}", "\n", raw_text)
+
+
+def extract_with_limit(body: str, backend: str, cpu_limit: float) -> Optional[str]:
+    """Runs in a worker process. Gives up on pages over cpu_limit CPU seconds.
+
+    The limit is a SIGPROF timer, and Python only runs signal handlers between
+    bytecodes. Time spent inside one call into a C parser (lxml, selectolax)
+    is not interrupted; the page is only given up once that call returns.
+    """
+
+    if cpu_limit:
+        signal.signal(signal.SIGPROF, raise_cpu_limit)
+        signal.setitimer(signal.ITIMER_PROF, cpu_limit)
+    try:
+        return html_to_text(body, backend)
+    except CpuLimitExceeded:
+        return None
+    finally:
+        if cpu_limit:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+class HtmlExtractor:
+    """HTML to text extraction off the event loop, in a process pool.
+
+    With workers=0 extraction runs inline on the loop, as it used to, and the
+    CPU limit does not apply. If a worker dies, e.g. killed for memory on a
+    huge page, the broken pool is replaced and the page is tried once more.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        backend: str = "html.parser",
+        cpu_limit: float = 1.0,
+    ) -> None:
+        self.workers = workers
+        self.backend = backend
+        self.cpu_limit = cpu_limit
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.pages = 0
+        self.over_limit = 0
+        self.pool_restarts = 0
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def extract(self, body: str) -> Optional[str]:
+        self.pages += 1
+        if not self.workers:
+            return html_to_text(body, self.backend)
+
+        loop = asyncio.get_running_loop()
+        args = (extract_with_limit, body, self.backend, self.cpu_limit)
+        pool = self.pool()
+        try:
+            text = await loop.run_in_executor(pool, *args)
+        except BrokenProcessPool:
+            self.restart(pool)
+            text = await loop.run_in_executor(self.pool(), *args)
+        if text is None:
+            self.over_limit += 1
+        return text
+
+    def restart(self, broken: ProcessPoolExecutor):
+        # Concurrent extractions all see the same broken pool; replace it once.
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self.pool_restarts += 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "pages": self.pages,
+            "over_cpu_limit": self.over_limit,
+            "pool_restarts": self.pool_restarts,
+        }
+
+
+html_extractor = HtmlExtractor(
+    workers=HTML_EXTRACT_WORKERS,
+    backend=HTML_EXTRACT_BACKEND,
+    cpu_limit=HTML_EXTRACT_CPU_LIMIT,
+)
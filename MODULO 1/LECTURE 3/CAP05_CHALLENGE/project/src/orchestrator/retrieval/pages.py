@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import zlib
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = ("utm_", "gclid", "fbclid")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a url: lower case scheme and host, no default port,
+    no fragment, no tracking parameters and sorted query parameters."""
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+@dataclass
+class Page:
+    data: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(self.data).decode("utf-8")
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """In-process LRU of extracted page text, keyed by normalized url.
+
+    Texts are kept zlib-compressed together with the ETag and Last-Modified
+    validators of the response. Pages younger than ttl seconds are served as
+    is; older ones are revalidated with a conditional request, so a 304 skips
+    both the download and the parsing. Least recently used pages are evicted
+    once the compressed texts exceed max_bytes.
+    """
+
+    def __init__(self, ttl: int = 3600, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.pages: OrderedDict[str, Page] = OrderedDict()
+        self.bytes_held = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[Page]:
+        key = normalize_url(url)
+        page = self.pages.get(key)
+        if page is not None:
+            self.pages.move_to_end(key)
+        return page
+
+    def is_fresh(self, page: Page) -> bool:
+        return time.monotonic() - page.stored_at < self.ttl
+
+    def hit(self, page: Page) -> str:
+        self.hits += 1
+        return page.text
+
+    def revalidate(self, page: Page) -> str:
+        self.revalidated += 1
+        page.stored_at = time.monotonic()
+        return page.text
+
+    def miss(self) -> None:
+        self.misses += 1
+
+    def put(
+        self,
+        url: str,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        key = normalize_url(url)
+        page = Page(
+            zlib.compress(text.encode("utf-8")), etag, last_modified, time.monotonic()
+        )
+        if len(page.data) > self.max_bytes:
+            return
+        self.discard(key)
+        self.pages[key] = page
+        self.bytes_held += len(page.data)
+        while self.bytes_held > self.max_bytes:
+            self.discard(next(iter(self.pages)))
+
+    def discard(self, key: str) -> None:
+        page = self.pages.pop(key, None)
+        if page is not None:
+            self.bytes_held -= len(page.data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "revalidate_rate": self.revalidated / lookups if lookups else 0.0,
+            "miss_rate": self.misses / lookups if lookups else 0.0,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "entries": len(self.pages),
+            "bytes_held": self.bytes_held,
+        }
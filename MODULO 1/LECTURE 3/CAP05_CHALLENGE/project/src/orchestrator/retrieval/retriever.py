@@ -1,17 +1,17 @@
 import asyncio
 import json
 import time
-from typing import Any, AsyncGenerator
-import numpy as np
-import pandas as pd
+from typing import AsyncGenerator, Optional
 from util import logger
 from models.document import Document
+from models.scrape import ScrapeReport
 from retrieval.search import Searcher
 from retrieval.cache import VectorDbCache
 from retrieval.splitter import Splitter
 from retrieval.scraper import Scraper
 from retrieval.embeddings import Embeddings
-from sklearn.metrics.pairwise import cosine_similarity
+from retrieval.similarity import cosine_scores, top_k
+from retrieval.tokens import ContextPacker
 from models.search import SearchDoc, SearchResult
 
 
@@ -23,15 +23,39 @@ class Retriever:
         scraper: Scraper,
         embeddings: Embeddings,
         splitter: Splitter,
+        scrape_concurrency: int = 10,
+        embed_batch_size: int = 64,
+        embed_concurrency: int = 4,
+        scrape_deadline: float = 10.0,
+        enough_pages: Optional[int] = None,
+        enough_chunks: Optional[int] = None,
+        progressive: bool = False,
+        min_chunks: int = 5,
+        similarity_floor: float = 0.75,
+        packer: Optional[ContextPacker] = None,
     ) -> None:
         self.cache = cache
         self.searcher = searcher
         self.scraper = scraper
         self.embeddings = embeddings
         self.splitter = splitter
+        self.scrape_concurrency = scrape_concurrency
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.scrape_deadline = scrape_deadline
+        self.enough_pages = enough_pages
+        self.enough_chunks = enough_chunks
+        self.progressive = progressive
+        self.min_chunks = min_chunks
+        self.similarity_floor = similarity_floor
+        self.packer = packer
 
     async def get_context(
-        self, query: str, cache_treshold: float = 0.85, k: int = 10
+        self,
+        query: str,
+        cache_treshold: float = 0.85,
+        k: int = 10,
+        search_cache: bool = True,
     ) -> AsyncGenerator[dict, None]:
         """Generates context based on query. It can retrieve from cache or from internet."""
 
@@ -46,76 +70,216 @@ class Retriever:
                 items=[SearchDoc(link=doc.url) for doc in documents]
             )
         else:
-            search_results = await self.searcher.run(query)
+            search_results = await self.searcher.run(query, use_cache=search_cache)
 
-        yield {"event": "search", "data": json.dumps(search_results.model_dump())}
+        search = search_results.model_dump()
+        if search_results.fallback:
+            search["fallback"] = True
+        yield {"event": "search", "data": json.dumps(search)}
 
+        provisional, early = None, False
         if not quality_cache:
-            documents = await self.search_for_documents(search_results, query_vector, k)
+            if self.progressive:
+                provisional = asyncio.get_running_loop().create_future()
+            pipeline = asyncio.create_task(
+                self.search_for_documents(search_results, query_vector, k, provisional)
+            )
+            try:
+                if provisional is not None:
+                    await asyncio.wait(
+                        {pipeline, provisional}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                # When the full pipeline is done as well, its documents win.
+                early = (
+                    provisional is not None
+                    and provisional.done()
+                    and not pipeline.done()
+                )
+                if early:
+                    # The answer starts from the pages in so far; the rest of
+                    # the pipeline keeps running while it streams and only
+                    # feeds the cache write.
+                    logger.info(f"PROVISIONAL CONTEXT: {len(provisional.result())}")
+                    context = self.build_context(provisional.result(), query)
+                    yield {"event": "context", "data": context}
+                documents, report = await pipeline
+            finally:
+                pipeline.cancel()
+            yield {"event": "scrape", "data": report.model_dump_json()}
             await self.cache.write(documents)
 
-        context = "\n".join([doc.text for doc in documents])
-        yield {"event": "context", "data": context}
+        if not early:
+            context = self.build_context(documents, query)
+            yield {"event": "context", "data": context}
+
+    def build_context(self, documents: list[Document], query: str) -> str:
+        """Joins the documents, within the packer's token budget if there is one."""
+
+        if self.packer is None:
+            return "\n".join([doc.text for doc in documents])
+        context, tokens = self.packer.pack(documents, query)
+        logger.info(f"PROMPT TOKENS: {tokens}")
+        return context
+
+    def enough(self, pages: int, chunks: int) -> bool:
+        if self.enough_pages and pages >= self.enough_pages:
+            return True
+        return bool(self.enough_chunks and chunks >= self.enough_chunks)
 
     async def search_for_documents(
-        self, search_results, query_vector, k
-    ) -> list[Document]:
-        """Searches for relevant information on the internet."""
+        self, search_results, query_vector, k, provisional=None
+    ) -> tuple[list[Document], ScrapeReport]:
+        """Searches for relevant information on the internet.
+
+        Pages are split as soon as they arrive and their splits are embedded in
+        micro-batches while the slower pages are still downloading. Scraping
+        stops at the scrape deadline or once enough pages or chunks are in;
+        the remaining downloads are cancelled. A failing url is only reported.
+
+        With a provisional future, each page is embedded as soon as it is split
+        and the future gets the best documents as soon as min_chunks of them
+        reach the similarity floor.
+        """
 
         start = time.perf_counter()
+        timings = {"split": 0.0, "embed": 0.0}
+        scrape_slots = asyncio.Semaphore(self.scrape_concurrency)
+        embed_slots = asyncio.Semaphore(self.embed_concurrency)
+
+        async def scrape(link):
+            async with scrape_slots:
+                return await self.scraper.fetch(link)
+
+        async def embed(batch):
+            async with embed_slots:
+                embed_start = time.perf_counter()
+                cached = await self.embed_documents(batch)
+                timings["embed"] += time.perf_counter() - embed_start
+            if provisional is not None and not provisional.done():
+                ready = await self.provisional_documents(query_vector, documents, k)
+                if ready:
+                    provisional.set_result(ready)
+            return cached
 
         results = search_results.model_dump()
-        tasks = [self.scraper.fetch(item["link"]) for item in results["items"]]
-        pages = await asyncio.gather(*tasks)
-
-        end = time.perf_counter()
-        logger.info(f"SCRAPE TIME: {end - start}")
-
-        documents = []
-        page_count = 0
-        for page in pages:
-            if page["text"]:
-                page_count += 1
-                splits = await self.splitter.split(page["text"])
-                for split in splits:
-                    documents.append({"text": split, "url": page["url"]})
-
-        logger.info(f"SCRAPED PAGES: {page_count}")
-        logger.info(f"SPLIT COUNT: {len(documents)}")
+        links = {
+            asyncio.create_task(scrape(item["link"])): item["link"]
+            for item in results["items"]
+        }
+        pending = set(links)
+        report = ScrapeReport()
 
-        embedding_start_time = time.perf_counter()
-        texts = [doc["text"] for doc in documents]
-        embeddings = await self.embeddings.run(texts)
+        documents, batch, embed_tasks = [], [], []
+        try:
+            try:
+                while pending and not self.enough(len(report.used), len(documents)):
+                    remaining = start + self.scrape_deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        url = links[task]
+                        if task.exception() is not None:
+                            report.failed[url] = repr(task.exception())
+                            continue
+                        page = task.result()
+                        if not page["text"]:
+                            report.failed[url] = "no text"
+                            continue
+
+                        report.used.append(url)
+                        split_start = time.perf_counter()
+                        splits = await self.splitter.split(page["text"])
+                        timings["split"] += time.perf_counter() - split_start
 
-        for i, vector in enumerate(embeddings):
-            documents[i]["vector"] = vector
+                        for split in splits:
+                            document = {"text": split, "url": page["url"]}
+                            documents.append(document)
+                            batch.append(document)
+                        while len(batch) >= self.embed_batch_size:
+                            micro_batch = batch[: self.embed_batch_size]
+                            batch = batch[self.embed_batch_size :]
+                            embed_tasks.append(asyncio.create_task(embed(micro_batch)))
+                        if provisional is not None and batch:
+                            embed_tasks.append(asyncio.create_task(embed(batch)))
+                            batch = []
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            report.cut_off = [links[task] for task in pending]
 
-        embedding_time = time.perf_counter() - embedding_start_time
-        logger.info(f"EMBEDDING TIME: {embedding_time}")
+            logger.info(f"SCRAPE TIME: {time.perf_counter() - start}")
+            if batch:
+                embed_tasks.append(asyncio.create_task(embed(batch)))
+            cached = await asyncio.gather(*embed_tasks)
+        finally:
+            # On cancellation or a failed micro-batch the others stop too, and
+            # their exceptions are retrieved rather than logged as never read.
+            for task in embed_tasks:
+                task.cancel()
+            await asyncio.gather(*embed_tasks, return_exceptions=True)
+
+        logger.info(f"SCRAPED PAGES: {len(report.used)}")
+        logger.info(f"CUT OFF PAGES: {report.cut_off}")
+        logger.info(f"FAILED PAGES: {report.failed}")
+        logger.info(f"SPLIT COUNT: {len(documents)}")
+        logger.info(f"CACHED SPLITS: {sum(cached)}")
+        logger.info(f"SPLIT TIME: {timings['split']}")
+        logger.info(f"EMBEDDING TIME: {timings['embed']}")
+        logger.info(f"PIPELINE TIME: {time.perf_counter() - start}")
 
         relevant_documents = await self.get_most_similar(query_vector, documents, k)
         mean_score = await self.get_mean_similarity(relevant_documents)
 
         logger.info(f"RETRIEVAL SCORE: {mean_score}")
-        return relevant_documents
+        return relevant_documents, report
 
-    async def get_most_similar(self, query_vector, data, k=5) -> list[Document]:
-        """Get most relevant texts based on cosine similarity"""
+    async def provisional_documents(
+        self, query_vector, documents: list[dict], k: int
+    ) -> list[Document]:
+        """Best embedded documents so far, if at least min_chunks of them reach
+        the similarity floor."""
+
+        embedded = [doc for doc in documents if doc.get("vector") is not None]
+        ranked = await self.get_most_similar(query_vector, embedded, k)
+        above = [doc for doc in ranked if doc.similarity >= self.similarity_floor]
+        return above if len(above) >= min(self.min_chunks, k) else []
 
-        query_vector = np.array(query_vector).reshape(1, -1)
+    async def embed_documents(self, documents: list[dict]) -> int:
+        """Adds a vector to each split, reusing cached ones. Returns how many were."""
 
-        def compute_cosine_similarity(row):
-            return cosine_similarity(query_vector, row)[0][0]
+        texts = [doc["text"] for doc in documents]
+        vectors = await self.cache.find_exact(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            embeddings = await self.embeddings.run([texts[i] for i in missing])
+            for i, vector in zip(missing, embeddings):
+                vectors[i] = vector
+
+        for document, vector in zip(documents, vectors):
+            document["vector"] = vector
+        return len(texts) - len(missing)
 
-        df: Any = pd.DataFrame(data)
-        df["vector"] = df["vector"].apply(lambda x: np.array(x).reshape(1, -1))
-        df["similarity"] = df["vector"].apply(compute_cosine_similarity)
-        similar = df.nlargest(k, "similarity")[["text", "url", "vector", "similarity"]]
-        similar["vector"] = similar["vector"].apply(lambda x: x[0].tolist())
+    async def get_most_similar(self, query_vector, data, k=5) -> list[Document]:
+        """Get most relevant texts based on cosine similarity"""
 
-        json_docs = similar.to_dict("records")
+        if not data:
+            return []
 
-        return [Document(**json_doc) for json_doc in json_docs]
+        scores = cosine_scores(query_vector, [doc["vector"] for doc in data])
+        return [
+            Document(
+                text=data[i]["text"],
+                url=data[i]["url"],
+                vector=data[i]["vector"],
+                similarity=float(scores[i]),
+            )
+            for i in top_k(scores, k)
+        ]
 
     async def evaluate_retrieval(
         self, documents: list[Document], treshold: float
@@ -1,48 +1,107 @@
 from abc import ABC, abstractmethod
-import re
-from typing import Any
+import asyncio
+import random
+from typing import Any, Optional
 
 import aiohttp
-from bs4 import BeautifulSoup
+from retrieval.extract import HtmlExtractor, html_extractor
+from retrieval.pages import PageCache
+from util.http import HttpPool, http_pool
 
 
 class Scraper(ABC):
+    extractor: HtmlExtractor = html_extractor
+
     @abstractmethod
     async def fetch(self, url: str) -> dict[str, Any]:
         pass
 
     async def parse(self, body):
-        """Parses all the text from the html."""
+        """Parses all the text from the html, off the event loop."""
 
-        soup = BeautifulSoup(body, "html.parser")
-        raw_text = soup.get_text(separator=" ", strip=True)
-        text = re.sub(r"\n{3,}|\s{2,}", "\n", raw_text)
-        return text
+        return await self.extractor.extract(body)
 
 
 class ScraperRemote(Scraper):
-    def __init__(self, host: str = "http://lb-scraper/scrape/?url=") -> None:
+    """Client of the scraper service.
+
+    A 429 answer is retried up to max_retries times. Each retry waits for the
+    Retry-After the service sent, or an exponential backoff from base_delay
+    without one, capped at max_delay seconds, plus up to as much again of
+    random jitter so rejected callers do not come back together.
+    """
+
+    def __init__(
+        self,
+        host: str = "http://lb-scraper/scrape/?url=",
+        http: HttpPool = http_pool,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+    ) -> None:
         self.host = host
+        self.http = http
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        try:
+            delay = float(retry_after) if retry_after else None
+        except ValueError:
+            delay = None
+        if delay is None:
+            delay = self.base_delay * 2**attempt
+        delay = min(delay, self.max_delay)
+        return delay + random.uniform(0, delay)
 
     async def fetch(self, url: str) -> dict[str, Any]:
-        async with aiohttp.ClientSession() as session:
-            query_url = self.host + url
-            async with session.post(query_url) as response:
+        query_url = self.host + url
+        for attempt in range(self.max_retries + 1):
+            async with self.http.session().post(query_url) as response:
                 if response.status == 200:
                     body = await response.json()
                     text = await self.parse(body["html"])
                     if text:
                         return {"url": url, "text": text}
-            return {"url": url, "text": None}
+                if response.status != 429 or attempt == self.max_retries:
+                    break
+                delay = self.backoff(attempt, response.headers.get("Retry-After"))
+            self.retries += 1
+            await asyncio.sleep(delay)
+        return {"url": url, "text": None}
 
 
 class ScraperLocal(Scraper):
+    def __init__(
+        self, http: HttpPool = http_pool, pages: Optional[PageCache] = None
+    ) -> None:
+        self.http = http
+        self.pages = pages
+
     async def fetch(self, url):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url, timeout=aiohttp.ClientTimeout(total=5)
-            ) as response:
-                html = await response.text()
-                text = await self.parse(html)
+        page = self.pages.get(url) if self.pages else None
+        if page is not None and self.pages.is_fresh(page):  # type: ignore
+            return {"url": url, "text": self.pages.hit(page)}  # type: ignore
 
+        headers = page.conditional_headers() if page else {}
+        async with self.http.session().get(
+            url, headers=headers, timeout=aiohttp.ClientTimeout(total=5)
+        ) as response:
+            if response.status == 304 and page is not None:
+                return {"url": url, "text": self.pages.revalidate(page)}  # type: ignore
+            html = await response.text()
+            text = await self.parse(html)
+            if self.pages is None:
                 return {"url": url, "text": text}
+            self.pages.miss()
+            if response.status == 200 and text:
+                self.pages.put(
+                    url,
+                    text,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+
+            return {"url": url, "text": text}
@@ -1,8 +1,13 @@
 from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import hashlib
 import os
+import re
+import time
 from urllib.parse import urlencode
 from models.search import SearchResult
-import aiohttp
+from util.http import HttpPool, http_pool
 
 from mocks.test_dict import provisional_search_result
 
@@ -18,17 +23,24 @@ REQUEST_HEADERS = {
 }
 
 
+def normalize_query(query: str) -> str:
+    """Case-folded query with punctuation dropped and whitespace collapsed."""
+
+    return " ".join(re.sub(r"[^\w\s]", " ", query.casefold()).split())
+
+
 class Searcher(ABC):
     @abstractmethod
-    async def run(self, query: str) -> SearchResult:
-        pass
+    async def run(self, query: str, use_cache: bool = True) -> SearchResult:
+        """Searches the query. Searchers without a cache ignore use_cache."""
 
 
 class GoogleAPI(Searcher):
-    def __init__(self) -> None:
+    def __init__(self, http: HttpPool = http_pool) -> None:
         super().__init__()
+        self.http = http
 
-    async def run(self, query: str) -> SearchResult:
+    async def run(self, query: str, use_cache: bool = True) -> SearchResult:
         query_params = urlencode(
             {
                 "key": GOOGLE_API_KEY,
@@ -39,14 +51,109 @@ class GoogleAPI(Searcher):
         )
         url = f"{GOOGLE_API_URL}{query_params}"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url,
-                headers=REQUEST_HEADERS,
-            ) as response:
-                r = await response.json()
-                try:
-                    return SearchResult(**r)
-                except Exception as e:
-                    print("SEARCHER", e)
-                    return SearchResult(**provisional_search_result)
+        async with self.http.session().get(
+            url,
+            headers=REQUEST_HEADERS,
+        ) as response:
+            r = await response.json()
+            try:
+                return SearchResult(**r)
+            except Exception as e:
+                print("SEARCHER", e)
+                return SearchResult(**provisional_search_result, fallback=True)
+
+
+class CachedSearcher(Searcher):
+    """TTL cache in front of any Searcher, keyed by the normalized query.
+
+    Results live in a process LRU and, when a Redis client is given, in a
+    shared Redis tier. Concurrent searches for the same normalized query share
+    one upstream call. With use_cache=False the upstream is always queried and
+    the fresh result replaces the cached one. Empty results and the fallback
+    served when the upstream failed are never cached.
+    """
+
+    def __init__(
+        self,
+        searcher: Searcher,
+        client=None,
+        ttl: int = 3600,
+        max_entries: int = 1000,
+    ) -> None:
+        self.searcher = searcher
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, tuple[float, SearchResult]] = OrderedDict()
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.bypassed = 0
+
+    def key(self, normalized: str) -> str:
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"searches:{digest}"
+
+    async def run(self, query: str, use_cache: bool = True) -> SearchResult:
+        normalized = normalize_query(query)
+        if not use_cache:
+            self.bypassed += 1
+            return await self.search(query, normalized)
+
+        cached = self.memory.get(normalized)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self.memory.move_to_end(normalized)
+            self.memory_hits += 1
+            return cached[1]
+
+        task = self.inflight.get(normalized)
+        if task is not None:
+            self.shared += 1
+        else:
+            task = asyncio.create_task(self.lookup(query, normalized))
+            self.inflight[normalized] = task
+            task.add_done_callback(lambda _: self.inflight.pop(normalized, None))
+        return await asyncio.shield(task)
+
+    async def lookup(self, query: str, normalized: str) -> SearchResult:
+        if self.client is not None:
+            reply = await self.client.get(self.key(normalized))
+            if reply is not None:
+                self.redis_hits += 1
+                result = SearchResult.model_validate_json(reply)
+                self.remember(normalized, result)
+                return result
+        self.misses += 1
+        return await self.search(query, normalized)
+
+    async def search(self, query: str, normalized: str) -> SearchResult:
+        result = await self.searcher.run(query)
+        if result.items and not result.fallback:
+            self.remember(normalized, result)
+            if self.client is not None:
+                await self.client.set(
+                    self.key(normalized), result.model_dump_json(), ex=self.ttl
+                )
+        return result
+
+    def remember(self, normalized: str, result: SearchResult) -> None:
+        self.memory[normalized] = (time.monotonic(), result)
+        self.memory.move_to_end(normalized)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.redis_hits + self.shared + self.misses
+        hits = self.memory_hits + self.redis_hits + self.shared
+        return {
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "shared_calls": self.shared,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "entries": len(self.memory),
+            "upstream_calls": self.misses + self.bypassed,
+        }
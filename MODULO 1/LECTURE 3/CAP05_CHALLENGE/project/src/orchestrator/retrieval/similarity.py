@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def normalize(vectors) -> np.ndarray:
+    """Returns a float32 copy of the vectors scaled to unit length."""
+
+    matrix = np.array(vectors, dtype=np.float32, ndmin=1)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_scores(query_vector, vectors) -> np.ndarray:
+    """Scores every vector against the query with a single matrix product."""
+
+    query = normalize(query_vector).reshape(-1)
+    return normalize(vectors) @ query
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates.sort()
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
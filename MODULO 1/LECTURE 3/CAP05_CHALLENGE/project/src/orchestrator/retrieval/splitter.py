@@ -1,7 +1,12 @@
 from abc import ABC, abstractmethod
+import asyncio
+from functools import lru_cache
 import numpy as np
-import spacy
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+SPACY_MODEL = "en_core_web_sm"
+# Sentence boundaries come from the parser and sentence vectors from the
+# tok2vec tensor; nothing else in the pipeline is used.
+UNUSED_PIPES = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
 
 
 class Splitter(ABC):
@@ -9,89 +14,125 @@ class Splitter(ABC):
     async def split(self, text: str) -> list[str]:
         pass
 
+    async def split_many(self, texts: list[str]) -> list[list[str]]:
+        return [await self.split(text) for text in texts]
+
 
 class LangChainSplitter(Splitter):
     def __init__(self, chunk_size, chunk_overlap, length_function) -> None:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.length_function = length_function
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-    async def split(self, text: str) -> list[str]:
-        text_splitter = RecursiveCharacterTextSplitter(
-            # Set a really small chunk size, just to show.
+        self.text_splitter = RecursiveCharacterTextSplitter(
             separators=["\n\n", "\n", " ", ""],
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
             length_function=self.length_function,
             # is_separator_regex=False,
         )
-        chunks = text_splitter.split_text(text)
+
+    async def split(self, text: str) -> list[str]:
+        chunks = self.text_splitter.split_text(text)
 
         return chunks
 
 
-nlp = spacy.load("en_core_web_sm")
+@lru_cache(maxsize=None)
+def load_nlp(model: str = SPACY_MODEL):
+    """Loads the spaCy model on first use, without the unused pipes."""
 
+    import spacy
 
-class AdjSenSplitter(Splitter):
-    def __init__(self) -> None:
-        pass
+    return spacy.load(model, exclude=UNUSED_PIPES)
 
-    async def process(self, text):
-        # Load the Spacy model
-        doc = nlp(text)
-        sents = list(doc.sents)
-        vecs = np.stack([sent.vector / sent.vector_norm for sent in sents])  # type: ignore
 
-        return sents, vecs
+class AdjSenSplitter(Splitter):
+    """Splits text into runs of adjacent sentences with similar vectors.
+
+    Texts go through nlp.pipe in batches of batch_size, over n_process
+    processes, in a worker thread so the event loop keeps serving. Clusters
+    longer than max_length are clustered again with the stricter
+    similarity_treshold from the sentence vectors already computed, instead
+    of parsing their text a second time.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        min_length: int = 60,
+        max_length: int = 3000,
+        batch_size: int = 16,
+        n_process: int = 1,
+        model: str = SPACY_MODEL,
+    ) -> None:
+        self.threshold = threshold
+        self.min_length = min_length
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.model = model
+        self.lock = asyncio.Lock()
+
+    async def split(self, text: str, similarity_treshold: float = 0.6) -> list[str]:
+        return (await self.split_many([text], similarity_treshold))[0]
+
+    async def split_many(
+        self, texts: list[str], similarity_treshold: float = 0.6
+    ) -> list[list[str]]:
+        # spaCy pipelines are not meant to be shared between threads.
+        async with self.lock:
+            return await asyncio.to_thread(self.split_batch, texts, similarity_treshold)
+
+    def split_batch(
+        self, texts: list[str], similarity_treshold: float
+    ) -> list[list[str]]:
+        docs = load_nlp(self.model).pipe(
+            texts, batch_size=self.batch_size, n_process=self.n_process
+        )
+        return [self.split_doc(doc, similarity_treshold) for doc in docs]
 
-    async def cluster_text(self, sents, vecs, threshold):
+    def process(self, doc) -> tuple[list[str], np.ndarray]:
+        sents = list(doc.sents)
+        if not sents:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        vecs = np.stack([sent.vector for sent in sents])
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs = np.divide(vecs, norms, out=np.zeros_like(vecs), where=norms > 0)
+        return [sent.text for sent in sents], vecs
+
+    def cluster_text(self, vecs: np.ndarray, threshold: float) -> list[list[int]]:
         clusters = [[0]]
-        for i in range(1, len(sents)):
+        for i in range(1, len(vecs)):
             if np.dot(vecs[i], vecs[i - 1]) < threshold:
                 clusters.append([])
             clusters[-1].append(i)
 
         return clusters
 
-    async def split(self, text: str, similarity_treshold: float = 0.6):
-        # Initialize the clusters lengths list and final texts list
-        clusters_lens = []
-        final_texts = []
-
-        # Process the chunk
-        threshold = 0.5
-        sents, vecs = await self.process(text)
-
-        # Cluster the sentences
-        clusters = await self.cluster_text(sents, vecs, threshold)
+    def split_doc(self, doc, similarity_treshold: float) -> list[str]:
+        sents, vecs = self.process(doc)
+        if not sents:
+            return []
 
-        for cluster in clusters:
-            cluster_txt = " ".join([sents[i].text for i in cluster])
-            cluster_len = len(cluster_txt)
+        final_texts = []
+        for cluster in self.cluster_text(vecs, self.threshold):
+            cluster_txt = " ".join([sents[i] for i in cluster])
 
             # Check if the cluster is too short
-            if cluster_len < 60:
+            if len(cluster_txt) < self.min_length:
                 continue
 
             # Check if the cluster is too long
-            elif cluster_len > 3000:
-                threshold = similarity_treshold
-                sents_div, vecs_div = await self.process(cluster_txt)
-                reclusters = await self.cluster_text(sents_div, vecs_div, threshold)
-
+            elif len(cluster_txt) > self.max_length:
+                reclusters = self.cluster_text(vecs[cluster], similarity_treshold)
                 for subcluster in reclusters:
-                    div_txt = " ".join([sents_div[i].text for i in subcluster])
-                    div_len = len(div_txt)
-
-                    if div_len < 60 or div_len > 3000:
-                        continue
-
-                    clusters_lens.append(div_len)
-                    final_texts.append(div_txt)
+                    div_txt = " ".join([sents[cluster[i]] for i in subcluster])
+                    if self.min_length <= len(div_txt) <= self.max_length:
+                        final_texts.append(div_txt)
 
             else:
-                clusters_lens.append(cluster_len)
                 final_texts.append(cluster_txt)
 
         return final_texts
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import hashlib
+from typing import Optional
+
+import tiktoken
+from models.document import Document
+
+
+class TokenCounter:
+    """Counts tokens with the chat model's tiktoken encoding.
+
+    count memoizes the result per SHA-256 of the text in an LRU of max_entries,
+    for chunks that are counted again and again; length always encodes and
+    is meant as a splitter length_function.
+    """
+
+    def __init__(
+        self, model: str = "gpt-3.5-turbo", max_entries: int = 100_000
+    ) -> None:
+        self.model = model
+        self.max_entries = max_entries
+        self.encoding: Optional[tiktoken.Encoding] = None
+        self.counts: OrderedDict[str, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def length(self, text: str) -> int:
+        if self.encoding is None:
+            self.encoding = tiktoken.encoding_for_model(self.model)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count(self, text: str) -> int:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        tokens = self.counts.get(key)
+        if tokens is not None:
+            self.counts.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+        self.misses += 1
+        tokens = self.counts[key] = self.length(text)
+        if len(self.counts) > self.max_entries:
+            self.counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.counts),
+        }
+
+
+class ContextPacker:
+    """Fills a prompt template with as many documents as fit a token budget.
+
+    Documents are taken by decreasing similarity; one that does not fit is
+    skipped so shorter ones after it can still be used. The budget covers the
+    whole formatted prompt, question included. pack returns the context with
+    the prompt's token count, so callers never encode the prompt again.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        template: str,
+        budget: int = 3000,
+        separator: str = "\n",
+    ) -> None:
+        self.counter = counter
+        self.template = template
+        self.budget = budget
+        self.separator = separator
+        self.requests = 0
+        self.tokens = 0
+        self.packed = 0
+        self.dropped = 0
+
+    def pack(self, documents: list[Document], question: str) -> tuple[str, int]:
+        used = self.counter.count(self.template.format(context="", question=question))
+        separator = self.counter.count(self.separator)
+        ranked = sorted(documents, key=lambda doc: doc.similarity or 0, reverse=True)
+
+        chosen = []
+        for doc in ranked:
+            tokens = self.counter.count(doc.text) + (separator if chosen else 0)
+            if used + tokens > self.budget:
+                continue
+            chosen.append(doc.text)
+            used += tokens
+
+        self.requests += 1
+        self.tokens += used
+        self.packed += len(chosen)
+        self.dropped += len(documents) - len(chosen)
+        return self.separator.join(chosen), used
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget,
+            "requests": self.requests,
+            "mean_prompt_tokens": self.tokens / self.requests if self.requests else 0,
+            "documents_packed": self.packed,
+            "documents_dropped": self.dropped,
+            "counter": self.counter.stats(),
+        }
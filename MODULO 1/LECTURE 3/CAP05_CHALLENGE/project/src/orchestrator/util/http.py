@@ -0,0 +1,113 @@
+import os
+import time
+from typing import Optional
+
+import aiohttp
+
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", 10))
+HTTP_DNS_TTL = int(os.environ.get("HTTP_DNS_TTL", 300))
+HTTP_KEEPALIVE = float(os.environ.get("HTTP_KEEPALIVE", 30))
+
+
+class HttpPool:
+    """One aiohttp session and connector shared by every outbound client.
+
+    The session is opened lazily inside the running loop and must be closed by
+    the application lifespan. Connection reuse and pool wait time are tracked
+    through aiohttp tracing.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_ttl: int = 300,
+        keepalive: float = 30,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.active = 0
+        self.created = 0
+        self.reused = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[self.trace_config()]
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.active += 1
+
+        async def on_request_done(session, context, params):
+            self.active -= 1
+
+        async def on_queued_start(session, context, params):
+            context.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, context, params):
+            self.waits += 1
+            self.wait_time += time.perf_counter() - context.queued_at
+
+        async def on_create_end(session, context, params):
+            self.created += 1
+
+        async def on_reuse(session, context, params):
+            self.reused += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_done)
+        trace.on_request_exception.append(on_request_done)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    def stats(self) -> dict:
+        idle = 0
+        if self._session is not None:
+            # aiohttp keeps idle keep-alive connections per host in _conns.
+            conns = getattr(self._session.connector, "_conns", {})
+            idle = sum(len(host_conns) for host_conns in conns.values())
+        connections = self.created + self.reused
+        return {
+            "active_requests": self.active,
+            "idle_connections": idle,
+            "connections_created": self.created,
+            "connections_reused": self.reused,
+            "reuse_ratio": self.reused / connections if connections else 0.0,
+            "pool_waits": self.waits,
+            "pool_wait_time": self.wait_time,
+        }
+
+
+http_pool = HttpPool(
+    limit=HTTP_POOL_LIMIT,
+    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+    dns_ttl=HTTP_DNS_TTL,
+    keepalive=HTTP_KEEPALIVE,
+)
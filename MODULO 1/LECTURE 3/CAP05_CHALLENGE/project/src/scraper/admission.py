@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
+import math
+import time
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """Bounds the scrapes a worker runs at once and the ones waiting for a slot.
+
+    Up to max_concurrency requests run; up to max_queue more wait, each for at
+    most queue_deadline seconds. Anything beyond that is rejected right away
+    with Overloaded, carrying a Retry-After estimate from the mean service
+    time and the current queue.
+    """
+
+    def __init__(
+        self, max_concurrency: int = 4, max_queue: int = 16, queue_deadline: float = 5
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_deadline = queue_deadline
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.service_time = 1.0
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self.service_time))
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected_full += 1
+            raise Overloaded("queue full", self.retry_after())
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_deadline)
+        except asyncio.TimeoutError:
+            self.rejected_deadline += 1
+            raise Overloaded("queue deadline exceeded", self.retry_after())
+        finally:
+            self.queued -= 1
+
+        self.admitted += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            elapsed = time.perf_counter() - start
+            self.service_time = 0.9 * self.service_time + 0.1 * elapsed
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "service_time": self.service_time,
+        }
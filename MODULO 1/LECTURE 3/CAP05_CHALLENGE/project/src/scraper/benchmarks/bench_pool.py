@@ -0,0 +1,88 @@
+"""Requests per second and latency of browser scrapes against local fixtures.
+
+Compares launching a new Firefox per request, as the service used to, with
+the per-worker BrowserPool:
+
+    python -m benchmarks.bench_pool --requests 100 --concurrency 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from benchmarks.fixtures import PAGES, serve_fixtures
+from browser import BrowserPool
+
+
+async def scrape_with_new_browser(url: str) -> str:
+    async with async_playwright() as p:
+        browser = await p.firefox.launch(headless=True)
+        try:
+            page = await browser.new_page()
+            await page.goto(url, timeout=10_000)
+            return await page.content()
+        finally:
+            await browser.close()
+
+
+def scrape_with_pool(pool: BrowserPool):
+    async def scrape(url: str) -> str:
+        async with pool.page() as page:
+            await page.goto(url, timeout=10_000)
+            return await page.content()
+
+    return scrape
+
+
+async def run(scrape, base_url: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await scrape(f"{base_url}/page/{i % PAGES}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, latencies
+
+
+def report(label: str, rate: float, latencies: list[float]):
+    p50 = statistics.median(latencies)
+    p95 = statistics.quantiles(latencies, n=100)[94]
+    print(f"{label:>12} {rate:>8.2f} req/s p50={p50:.3f}s p95={p95:.3f}s")
+
+
+async def main(requests: int, concurrency: int):
+    runner, base_url = await serve_fixtures()
+    try:
+        rate, latencies = await run(
+            scrape_with_new_browser, base_url, requests, concurrency
+        )
+        report("per-request", rate, latencies)
+
+        pool = BrowserPool(max_pages=concurrency)
+        await pool.start()
+        try:
+            rate, latencies = await run(
+                scrape_with_pool(pool), base_url, requests, concurrency
+            )
+            report("pool", rate, latencies)
+            print(pool.stats())
+        finally:
+            await pool.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,60 @@
+"""Bytes transferred and render time per page, with and without interception.
+
+Renders the heavy fixture pages once waiting for the full load event with no
+interception, as the service used to, and once with the default PageRenderer:
+
+    python -m benchmarks.bench_render --pages 50
+"""
+import argparse
+import asyncio
+
+from benchmarks.fixtures import PAGES, serve_fixtures
+from browser import BrowserPool
+from render import PageRenderer
+
+
+async def run(pool: BrowserPool, renderer: PageRenderer, base_url: str, pages: int):
+    for i in range(pages):
+        async with pool.page() as page:
+            await renderer.render(page, f"{base_url}/heavy/{i % PAGES}")
+
+
+def report(label: str, renderer: PageRenderer):
+    stats = renderer.stats()
+    print(
+        f"{label:>12} bytes/page={stats['bytes_mean']:>10.0f} "
+        f"render p50={stats['render_p50']:.3f}s p95={stats['render_p95']:.3f}s "
+        f"blocked={stats['blocked']}"
+    )
+
+
+async def main(pages: int):
+    runner, base_url = await serve_fixtures()
+    # A fresh context per page so neither run benefits from the HTTP cache.
+    pool = BrowserPool(max_pages=1, max_uses=1)
+    await pool.start()
+    try:
+        baseline = PageRenderer(
+            blocked_types=(),
+            block_third_party=False,
+            trackers=(),
+            wait_until="load",
+            min_text=0,
+            deadline=30,
+        )
+        await run(pool, baseline, base_url, pages)
+        report("full load", baseline)
+
+        intercepted = PageRenderer(deadline=30)
+        await run(pool, intercepted, base_url, pages)
+        report("intercepted", intercepted)
+    finally:
+        await pool.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages))
@@ -0,0 +1,69 @@
+"""Local static HTTP server used as the scrape target in benchmarks.
+
+/page/<i> are text-only pages. /heavy/<i> pages also pull images, a font, a
+stylesheet and a tracker script from the other host name of the same server
+(localhost instead of 127.0.0.1), which counts as a third party.
+"""
+from aiohttp import web
+
+PAGES = 50
+PARAGRAPHS = 40
+IMAGES = 10
+ASSET_SIZE = 50_000
+
+
+def page(i: int) -> str:
+    body = "\n".join(
+        f"<p>Fixture page {i}, paragraph {j}. Lorem ipsum dolor sit amet.</p>"
+        for j in range(PARAGRAPHS)
+    )
+    return f"<html><head><title>Page {i}</title></head><body>{body}</body></html>"
+
+
+def heavy_page(i: int, port: int) -> str:
+    third_party = f"http://localhost:{port}"
+    head = (
+        f"<title>Page {i}</title>"
+        '<link rel="stylesheet" href="/asset/style.css">'
+        f'<script src="{third_party}/asset/tracker.js"></script>'
+        "<style>@font-face { font-family: f; src: url(/asset/font.woff2); }"
+        " body { font-family: f; }</style>"
+    )
+    images = "".join(f'<img src="/asset/image{j}.png">' for j in range(IMAGES))
+    body = page(i).split("<body>", 1)[1].rsplit("</body>", 1)[0]
+    return f"<html><head>{head}</head><body>{images}{body}</body></html>"
+
+
+async def serve_fixtures(port: int = 0) -> tuple[web.AppRunner, str]:
+    """Starts the fixture server and returns the runner and its base url."""
+
+    pages = {f"/page/{i}": page(i) for i in range(PAGES)}
+    asset = b"x" * ASSET_SIZE
+    content_types = {
+        ".css": "text/css",
+        ".js": "application/javascript",
+        ".png": "image/png",
+        ".woff2": "font/woff2",
+    }
+
+    async def handle(request: web.Request) -> web.Response:
+        if request.path.startswith("/asset/"):
+            extension = "." + request.path.rsplit(".", 1)[-1]
+            return web.Response(body=asset, content_type=content_types[extension])
+        if request.path.startswith("/heavy/"):
+            i = int(request.path.rsplit("/", 1)[1])
+            html = heavy_page(i, request.url.port)  # type: ignore
+        else:
+            html = pages.get(request.path)
+        if html is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=html, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
@@ -0,0 +1,253 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+import os
+import time
+from typing import Any, AsyncIterator, Optional
+
+from playwright.async_api import Browser, BrowserContext, Error, Page
+from playwright.async_api import async_playwright
+
+
+def process_tree_rss(pid: Optional[int] = None) -> int:
+    """Resident memory in bytes of a process and all of its descendants.
+
+    Reads /proc, so it only works on Linux; elsewhere it returns 0.
+    """
+
+    pid = pid or os.getpid()
+    children: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+@dataclass
+class Slot:
+    browser: Browser
+    context: BrowserContext
+    page: Page
+    uses: int = 0
+
+
+class BrowserPool:
+    """One long-lived headless Firefox per worker with reusable contexts.
+
+    At most max_pages pages are in use at once; further callers wait. A
+    context is closed after max_uses pages, and the whole browser is replaced
+    after browser_max_uses pages or once the worker's process tree holds more
+    than memory_limit bytes, sampled at most every memory_interval seconds. A
+    browser that died is replaced on the next lease. Pages still in use finish
+    on the old browser, which is closed when the last of them is released.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 4,
+        max_uses: int = 50,
+        browser_max_uses: int = 1000,
+        memory_limit: int = 1024 * 1024 * 1024,
+        memory_interval: float = 5.0,
+        launch_options: Optional[dict[str, Any]] = None,
+    ) -> None:
+        self.max_pages = max_pages
+        self.max_uses = max_uses
+        self.browser_max_uses = browser_max_uses
+        self.memory_limit = memory_limit
+        self.memory_interval = memory_interval
+        self.rss = 0
+        self.rss_sampled = 0.0
+        self.launch_options = launch_options or {"headless": True}
+        self.semaphore = asyncio.Semaphore(max_pages)
+        self.lock = asyncio.Lock()
+        self.playwright = None
+        self.browser: Optional[Browser] = None
+        self.idle: list[Slot] = []
+        self.leased: dict[Browser, int] = {}
+        self.browser_uses = 0
+        self.pages_served = 0
+        self.contexts_created = 0
+        self.contexts_recycled = 0
+        self.browsers_launched = 0
+        self.browsers_recycled = 0
+        self.waiting = 0
+        self.in_use = 0
+
+    async def start(self) -> None:
+        async with self.lock:
+            if self.browser is None:
+                self.playwright = await async_playwright().start()
+                await self.launch()
+
+    async def launch(self) -> None:
+        firefox = self.playwright.firefox  # type: ignore
+        self.browser = await firefox.launch(**self.launch_options)
+        self.leased[self.browser] = 0
+        self.browser_uses = 0
+        # Give the new browser a full interval before judging its memory.
+        self.rss, self.rss_sampled = 0, time.monotonic()
+        self.browsers_launched += 1
+
+    async def close(self) -> None:
+        async with self.lock:
+            for slot in self.idle:
+                with suppress(Error):
+                    await slot.context.close()
+            self.idle.clear()
+            for browser in list(self.leased):
+                with suppress(Error):
+                    await browser.close()
+            self.leased.clear()
+            self.browser = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """Leases a page, waiting while max_pages are already in use."""
+
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        try:
+            slot = await self.acquire()
+            healthy = False
+            try:
+                yield slot.page
+                healthy = True
+            finally:
+                await self.release(slot, healthy)
+        finally:
+            self.in_use -= 1
+            self.semaphore.release()
+
+    async def acquire(self) -> Slot:
+        if self.browser is None:
+            await self.start()
+        if not self.browser.is_connected():  # type: ignore
+            await self.recycle(self.browser)  # type: ignore
+        if self.idle:
+            slot = self.idle.pop()
+        else:
+            try:
+                slot = await self.new_slot()
+            except Error:
+                # The browser may have died since the check; relaunch it once.
+                await self.recycle(self.browser)  # type: ignore
+                slot = await self.new_slot()
+        self.leased[slot.browser] += 1
+        return slot
+
+    async def new_slot(self) -> Slot:
+        browser = self.browser
+        context = await browser.new_context()  # type: ignore
+        try:
+            page = await context.new_page()
+        except Error:
+            with suppress(Error):
+                await context.close()
+            raise
+        self.contexts_created += 1
+        return Slot(browser, context, page)  # type: ignore
+
+    async def release(self, slot: Slot, healthy: bool) -> None:
+        slot.uses += 1
+        self.pages_served += 1
+        if slot.browser not in self.leased:
+            return
+        self.leased[slot.browser] -= 1
+        if slot.browser is self.browser:
+            self.browser_uses += 1
+
+        reuse = healthy and slot.browser is self.browser and slot.uses < self.max_uses
+        if reuse:
+            try:
+                await slot.context.clear_cookies()
+            except Error:
+                reuse = False
+        if reuse:
+            self.idle.append(slot)
+        else:
+            with suppress(Error):
+                await slot.context.close()
+            self.contexts_recycled += 1
+
+        if slot.browser is self.browser and self.should_recycle():
+            await self.recycle(slot.browser)
+        elif slot.browser is not self.browser and not self.leased[slot.browser]:
+            del self.leased[slot.browser]
+            with suppress(Error):
+                await slot.browser.close()
+
+    def should_recycle(self) -> bool:
+        if not self.browser.is_connected():  # type: ignore
+            return True
+        if self.browser_uses >= self.browser_max_uses:
+            return True
+        if not self.memory_limit:
+            return False
+        now = time.monotonic()
+        if now - self.rss_sampled >= self.memory_interval:
+            self.rss, self.rss_sampled = process_tree_rss(), now
+        return self.rss > self.memory_limit
+
+    async def recycle(self, old: Browser) -> None:
+        async with self.lock:
+            if self.browser is not old:
+                return
+            for slot in self.idle:
+                with suppress(Error):
+                    await slot.context.close()
+                self.contexts_recycled += 1
+            self.idle.clear()
+            await self.launch()
+            self.browsers_recycled += 1
+            if not self.leased.get(old):
+                self.leased.pop(old, None)
+                with suppress(Error):
+                    await old.close()
+
+    def stats(self) -> dict:
+        return {
+            "max_pages": self.max_pages,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "idle": len(self.idle),
+            "pages_served": self.pages_served,
+            "contexts_created": self.contexts_created,
+            "contexts_recycled": self.contexts_recycled,
+            "browsers_launched": self.browsers_launched,
+            "browsers_recycled": self.browsers_recycled,
+            "browser_uses": self.browser_uses,
+            "rss_bytes": process_tree_rss(),
+        }
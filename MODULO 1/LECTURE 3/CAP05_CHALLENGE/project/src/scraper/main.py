@@ -1,50 +1,165 @@
+import asyncio
+import os
 import time
-from fastapi import FastAPI, HTTPException
-from playwright.async_api import async_playwright
+from typing import Optional
+from urllib.parse import urlsplit
+from fastapi import FastAPI, HTTPException, Request
 from playwright._impl._api_types import TimeoutError
 from contextlib import asynccontextmanager
 import logging
 import aiohttp
+from admission import AdmissionControl, Overloaded
+from browser import BrowserPool
+from render import BLOCKED_TYPES, TRACKER_DOMAINS as TRACKERS, PageRenderer
+from tiers import BROWSER, HTTP, JS_REASONS, TierRouter, js_reason
+
+MAX_PAGES = int(os.environ.get("SCRAPER_MAX_PAGES", 4))
+CONTEXT_MAX_USES = int(os.environ.get("SCRAPER_CONTEXT_MAX_USES", 50))
+BROWSER_MAX_USES = int(os.environ.get("SCRAPER_BROWSER_MAX_USES", 1000))
+MEMORY_LIMIT_MB = int(os.environ.get("SCRAPER_MEMORY_LIMIT_MB", 1024))
+MEMORY_INTERVAL = float(os.environ.get("SCRAPER_MEMORY_INTERVAL", 5))
+MIN_TEXT_CHARS = int(os.environ.get("SCRAPER_MIN_TEXT_CHARS", 200))
+MAX_SCRIPT_RATIO = float(os.environ.get("SCRAPER_MAX_SCRIPT_RATIO", 0.5))
+HTTP_TIMEOUT = float(os.environ.get("SCRAPER_HTTP_TIMEOUT", 3))
+BLOCKED_RESOURCES = os.environ.get("SCRAPER_BLOCKED_RESOURCES", ",".join(BLOCKED_TYPES))
+BLOCK_THIRD_PARTY = os.environ.get("SCRAPER_BLOCK_THIRD_PARTY", "true") == "true"
+ALLOWED_DOMAINS = os.environ.get("SCRAPER_ALLOWED_DOMAINS", "")
+TRACKER_DOMAINS = os.environ.get("SCRAPER_TRACKER_DOMAINS", ",".join(TRACKERS))
+RENDER_DEADLINE = float(os.environ.get("SCRAPER_RENDER_DEADLINE", 2))
+MAX_CONCURRENCY = int(os.environ.get("SCRAPER_MAX_CONCURRENCY", 8))
+MAX_QUEUE = int(os.environ.get("SCRAPER_MAX_QUEUE", 16))
+QUEUE_DEADLINE = float(os.environ.get("SCRAPER_QUEUE_DEADLINE", 5))
 
 logger = logging.getLogger(__name__)
-app = FastAPI()
+pool = BrowserPool(
+    max_pages=MAX_PAGES,
+    max_uses=CONTEXT_MAX_USES,
+    browser_max_uses=BROWSER_MAX_USES,
+    memory_limit=MEMORY_LIMIT_MB * 1024 * 1024,
+    memory_interval=MEMORY_INTERVAL,
+)
+tiers = TierRouter()
+admission = AdmissionControl(
+    max_concurrency=MAX_CONCURRENCY,
+    max_queue=MAX_QUEUE,
+    queue_deadline=QUEUE_DEADLINE,
+)
+renderer = PageRenderer(
+    blocked_types=[t.strip() for t in BLOCKED_RESOURCES.split(",") if t.strip()],
+    block_third_party=BLOCK_THIRD_PARTY,
+    allowlist=[d.strip() for d in ALLOWED_DOMAINS.split(",") if d.strip()],
+    trackers=[d.strip() for d in TRACKER_DOMAINS.split(",") if d.strip()],
+    min_text=MIN_TEXT_CHARS,
+    deadline=RENDER_DEADLINE,
+)
 
 
-async def fetch_check_js(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, timeout=aiohttp.ClientTimeout(total=3)) as response:
-            html = await response.text()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the worker's browser and HTTP session once and closes them on
+    shutdown."""
 
-            # if not "text/javascript" in html:
-            return html
-    return None
+    await pool.start()
+    app.state.session = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    )
+    yield
+    await app.state.session.close()
+    await pool.close()
 
 
-@asynccontextmanager
-async def launch_browser():
-    async with async_playwright() as p:
-        browser = await p.firefox.launch(headless=True)
-        try:
-            yield browser
-        finally:
-            await browser.close()
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def load_headers(request: Request, call_next):
+    """Reports the worker's load on every response for the load balancer."""
+
+    response = await call_next(request)
+    response.headers["X-Queue-Depth"] = str(admission.queued)
+    response.headers["X-In-Flight"] = str(admission.in_flight)
+    return response
+
+
+async def fetch_check_js(url: str) -> tuple[Optional[str], Optional[str]]:
+    """Fetches url over plain HTTP. Returns the html, or None and the reason
+    the page needs the browser instead."""
+
+    try:
+        async with app.state.session.get(url) as response:
+            if response.status != 200:
+                return None, f"status_{response.status}"
+            if "html" not in response.headers.get("Content-Type", "html"):
+                return None, "not_html"
+            html = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+        return None, "http_error"
+
+    reason = js_reason(html, MIN_TEXT_CHARS, MAX_SCRIPT_RATIO)
+    if reason is not None:
+        return None, reason
+    return html, None
 
 
 async def scrape_with_browser(url: str):
-    async with launch_browser() as browser:
-        page = await browser.new_page()
-        await page.goto(url, timeout=2000)
-        html = await page.content()
-    return html
+    async with pool.page() as page:
+        return await renderer.render(page, url)
+
+
+async def scrape_tiered(url: str) -> tuple[str, str]:
+    """Tries plain HTTP first and renders with the browser only when the page
+    needs it, or when its domain needed it before."""
+
+    domain = urlsplit(url).hostname or ""
+    decision, reason = "browser_remembered", None
+    if tiers.tier_for(domain) == HTTP:
+        start = time.perf_counter()
+        html, reason = await fetch_check_js(url)
+        if html is not None:
+            tiers.remember(domain, HTTP)
+            tiers.record(HTTP, time.perf_counter() - start, "http")
+            return html, HTTP
+        decision = f"browser_{reason}"
+
+    start = time.perf_counter()
+    html = await scrape_with_browser(url)
+    # HTTP errors, odd statuses and non-html answers say nothing about the
+    # domain, so only script-rendered pages pin it to the browser.
+    if reason in JS_REASONS:
+        tiers.remember(domain, BROWSER)
+    tiers.record(BROWSER, time.perf_counter() - start, decision)
+    return html, BROWSER
 
 
 @app.post("/scrape")
 async def scrape_url(url: str):
     try:
-        html = await scrape_with_browser(url)
+        async with admission.slot():
+            html, tier = await scrape_tiered(url)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except TimeoutError:
         raise HTTPException(status_code=408, detail="Not fast enough")
-    return {"html": html}
+    return {"html": html, "tier": tier}
+
+
+@app.get("/load")
+async def load() -> dict:
+    return {"queue_depth": admission.queued, "in_flight": admission.in_flight}
+
+
+@app.get("/stats")
+async def stats() -> dict:
+    return {
+        "admission": admission.stats(),
+        "browser": pool.stats(),
+        "tiers": tiers.stats(),
+        "render": renderer.stats(),
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+import asyncio
+from collections import deque
+from functools import lru_cache
+import statistics
+import time
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page, Request, Route, TimeoutError
+import tldextract
+
+BLOCKED_TYPES = ("image", "media", "font", "stylesheet")
+# What a script-rendered page needs to build its text, wherever it is served from.
+RENDER_TYPES = ("document", "script", "xhr", "fetch")
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adnxs.com",
+    "amazon-adsystem.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "scorecardresearch.com",
+    "hotjar.com",
+    "connect.facebook.net",
+    "segment.io",
+)
+TEXT_READY = "min => document.body && document.body.innerText.length >= min"
+# Uses the public suffix list bundled with tldextract, nothing is downloaded.
+SUFFIXES = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+@lru_cache(maxsize=4096)
+def site_of(host: Optional[str]) -> str:
+    """Registrable domain of a host, e.g. news.bbc.co.uk -> bbc.co.uk. Hosts
+    without one, like IP addresses, are their own site."""
+
+    host = (host or "").lower()
+    return SUFFIXES(host).registered_domain or host
+
+
+def matches(host: str, domains: tuple[str, ...]) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class PageRenderer:
+    """Renders a page for its text while skipping what the text does not need.
+
+    Requests to tracker domains, for blocked_types and, with block_third_party,
+    for another site's resources other than render_types are aborted, unless
+    their host is an allowlist domain or one of its subdomains. Sites are
+    registrable domains, so every *.co.uk host is not one site. Navigation
+    waits for wait_until and then for min_text characters of body text, all
+    within deadline seconds; if the text does not show up in time, whatever
+    has rendered is returned.
+    """
+
+    def __init__(
+        self,
+        blocked_types: Iterable[str] = BLOCKED_TYPES,
+        block_third_party: bool = True,
+        allowlist: Iterable[str] = (),
+        trackers: Iterable[str] = TRACKER_DOMAINS,
+        render_types: Iterable[str] = RENDER_TYPES,
+        wait_until: str = "domcontentloaded",
+        min_text: int = 200,
+        deadline: float = 2.0,
+        samples: int = 1000,
+    ) -> None:
+        self.blocked_types = set(blocked_types)
+        self.block_third_party = block_third_party
+        self.allowlist = tuple(domain.lower() for domain in allowlist if domain)
+        self.trackers = tuple(domain.lower() for domain in trackers if domain)
+        self.render_types = set(render_types)
+        self.wait_until = wait_until
+        self.min_text = min_text
+        self.deadline = deadline
+        self.render_times = deque(maxlen=samples)
+        self.bytes = deque(maxlen=samples)
+        self.blocked: dict[str, int] = {}
+        self.allowed = 0
+        self.text_timeouts = 0
+
+    def block_reason(self, request: Request, site: str, page: Page) -> Optional[str]:
+        if request.is_navigation_request() and request.frame == page.main_frame:
+            return None
+        host = (urlsplit(request.url).hostname or "").lower()
+        if matches(host, self.allowlist):
+            return None
+        if matches(host, self.trackers):
+            return "tracker"
+        if request.resource_type in self.blocked_types:
+            return request.resource_type
+        if (
+            self.block_third_party
+            and request.resource_type not in self.render_types
+            and host
+            and site_of(host) != site
+        ):
+            return "third_party"
+        return None
+
+    async def render(self, page: Page, url: str) -> str:
+        site = site_of(urlsplit(url).hostname)
+        finished: list[Request] = []
+
+        async def route(route: Route):
+            reason = self.block_reason(route.request, site, page)
+            if reason is None:
+                self.allowed += 1
+                await route.continue_()
+            else:
+                self.blocked[reason] = self.blocked.get(reason, 0) + 1
+                await route.abort()
+
+        intercept = bool(self.blocked_types or self.block_third_party or self.trackers)
+        if intercept:
+            await page.route("**/*", route)
+        listener = finished.append
+        page.on("requestfinished", listener)
+        start = time.perf_counter()
+        try:
+            await page.goto(
+                url,
+                wait_until=self.wait_until,  # type: ignore
+                timeout=self.deadline * 1000,
+            )
+            remaining = self.deadline - (time.perf_counter() - start)
+            if self.min_text and remaining > 0:
+                try:
+                    await page.wait_for_function(
+                        TEXT_READY, arg=self.min_text, timeout=remaining * 1000
+                    )
+                except TimeoutError:
+                    self.text_timeouts += 1
+            html = await page.content()
+        finally:
+            page.remove_listener("requestfinished", listener)
+            if intercept:
+                await page.unroute("**/*", route)
+        self.render_times.append(time.perf_counter() - start)
+
+        sizes = await asyncio.gather(
+            *[request.sizes() for request in finished], return_exceptions=True
+        )
+        self.bytes.append(
+            sum(
+                size["responseBodySize"] + size["responseHeadersSize"]
+                for size in sizes
+                if isinstance(size, dict)
+            )
+        )
+        return html
+
+    def stats(self) -> dict:
+        stats = {
+            "pages": len(self.render_times),
+            "blocked": self.blocked,
+            "allowed": self.allowed,
+            "text_timeouts": self.text_timeouts,
+        }
+        if len(self.render_times) >= 2:
+            stats["render_p50"] = statistics.median(self.render_times)
+            stats["render_p95"] = statistics.quantiles(self.render_times, n=100)[94]
+            stats["bytes_mean"] = statistics.mean(self.bytes)
+        return stats
@@ -0,0 +1,105 @@
+from collections import OrderedDict, deque
+import re
+import statistics
+from typing import Optional
+
+HTTP = "http"
+BROWSER = "browser"
+
+SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.S | re.I)
+STYLE_RE = re.compile(r"<style\b[^>]*>.*?</style\s*>", re.S | re.I)
+NOSCRIPT_RE = re.compile(r"<noscript\b[^>]*>(.*?)</noscript\s*>", re.S | re.I)
+TAG_RE = re.compile(r"<[^>]+>")
+EMPTY_ROOT_RE = re.compile(
+    r"<div\s+id=[\"'](?:root|app|__next|__nuxt)[\"'][^>]*>\s*</div>", re.I
+)
+JS_MARKERS = (
+    "enable javascript",
+    "javascript is required",
+    "javascript is disabled",
+    "requires javascript",
+    "turn on javascript",
+)
+# js_reason results that say the page is rendered by scripts, as opposed to
+# an empty or failed response.
+JS_REASONS = frozenset({"empty_text", "script_density", "empty_root", "noscript"})
+
+
+def visible_text(html: str) -> str:
+    for pattern in (SCRIPT_RE, STYLE_RE, NOSCRIPT_RE):
+        html = pattern.sub(" ", html)
+    return " ".join(TAG_RE.sub(" ", html).split())
+
+
+def js_reason(
+    html: str, min_text: int = 200, max_script_ratio: float = 0.5
+) -> Optional[str]:
+    """Why a plain HTTP response looks like it needs JavaScript to render, or
+    None when its text can be used as is."""
+
+    if not html:
+        return "empty_body"
+    script_bytes = sum(len(script) for script in SCRIPT_RE.findall(html))
+    text = visible_text(html)
+    if len(text) < min_text:
+        return "empty_text"
+    if script_bytes / len(html) > max_script_ratio and len(text) < 4 * min_text:
+        return "script_density"
+    if EMPTY_ROOT_RE.search(html) and len(text) < 4 * min_text:
+        return "empty_root"
+    noscript = " ".join(NOSCRIPT_RE.findall(html)).lower()
+    markers = noscript + " " + text[: 4 * min_text].lower()
+    if any(marker in markers for marker in JS_MARKERS) and len(text) < 4 * min_text:
+        return "noscript"
+    return None
+
+
+class TierRouter:
+    """Remembers per domain which fetch tier worked and keeps tier stats.
+
+    Domains start on plain HTTP. Once a page of a domain looked rendered by
+    JavaScript, later urls of that domain go straight to the browser until the
+    domain is evicted from the max_domains LRU.
+    """
+
+    def __init__(self, max_domains: int = 10_000, samples: int = 1000) -> None:
+        self.max_domains = max_domains
+        self.domains: OrderedDict[str, str] = OrderedDict()
+        self.latencies = {HTTP: deque(maxlen=samples), BROWSER: deque(maxlen=samples)}
+        self.decisions: dict[str, int] = {}
+
+    def tier_for(self, domain: str) -> str:
+        tier = self.domains.get(domain, HTTP)
+        if domain in self.domains:
+            self.domains.move_to_end(domain)
+        return tier
+
+    def remember(self, domain: str, tier: str) -> None:
+        self.domains[domain] = tier
+        self.domains.move_to_end(domain)
+        while len(self.domains) > self.max_domains:
+            self.domains.popitem(last=False)
+
+    def record(self, tier: str, elapsed: float, decision: str) -> None:
+        self.latencies[tier].append(elapsed)
+        self.decisions[decision] = self.decisions.get(decision, 0) + 1
+
+    def stats(self) -> dict:
+        latency = {}
+        for tier, samples in self.latencies.items():
+            if len(samples) < 2:
+                latency[tier] = {"count": len(samples)}
+                continue
+            latency[tier] = {
+                "count": len(samples),
+                "p50": statistics.median(samples),
+                "p95": statistics.quantiles(samples, n=100)[94],
+            }
+        return {
+            "decisions": self.decisions,
+            "latency": latency,
+            "browser_domains": sum(
+                1 for tier in self.domains.values() if tier == BROWSER
+            ),
+            "domains": len(self.domains),
+        }
@@ -0,0 +1,46 @@
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import uvicorn
+
+# The orchestrator imports its modules relative to its own directory.
+sys.path.insert(0, str(Path(__file__).parents[1] / "src" / "orchestrator"))
+
+# retrieval.search reads its configuration when imported.
+for name in (
+    "GOOGLE_API_HOST",
+    "GOOGLE_API_KEY",
+    "GOOGLE_CX",
+    "GOOGLE_FIELDS",
+    "HEADER_ACCEPT_ENCODING",
+    "HEADER_USER_AGENT",
+):
+    os.environ.setdefault(name, "")
+
+
+@pytest.fixture
+def serve():
+    """Starts ASGI apps on free local ports, in threads, and returns their URLs."""
+
+    servers = []
+
+    def start(app) -> str:
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]})
+        thread.start()
+        servers.append((server, thread))
+        while not server.started:
+            time.sleep(0.01)
+        return "http://127.0.0.1:{}".format(sock.getsockname()[1])
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join()
@@ -0,0 +1,82 @@
+import asyncio
+
+import openai
+import pytest
+
+from llm import chat as chat_module
+from llm import OpenAIChat
+from mocks import fake_llm_server
+
+
+@pytest.fixture
+def llm(serve, monkeypatch):
+    monkeypatch.setattr(fake_llm_server, "TOKENS", 20)
+    monkeypatch.setattr(fake_llm_server, "TOKEN_DELAY", 0)
+    monkeypatch.setattr(
+        fake_llm_server, "streams", {"started": 0, "finished": 0, "cancelled": 0}
+    )
+    monkeypatch.setattr(openai, "api_base", serve(fake_llm_server.app) + "/v1")
+    monkeypatch.setattr(openai, "api_key", "test")
+    return fake_llm_server
+
+
+def producers() -> list[asyncio.Task]:
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if task.get_coro().__qualname__ == "OpenAIChat.produce"  # type: ignore
+    ]
+
+
+def test_tokens_arrive_in_order(llm):
+    async def collect():
+        return [token async for token in OpenAIChat(buffer_size=4).stream("hi")]
+
+    tokens = asyncio.run(collect())
+    assert tokens == [f"token{i} " for i in range(llm.TOKENS)]
+    assert llm.streams["finished"] == 1
+
+
+def test_full_buffer_pauses_the_producer(llm, monkeypatch):
+    queues = []
+
+    class Queue(asyncio.Queue):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            queues.append(self)
+
+    monkeypatch.setattr(chat_module.asyncio, "Queue", Queue)
+
+    async def consume_slowly():
+        stream = OpenAIChat(buffer_size=2).stream("hi")
+        tokens = [await stream.__anext__()]
+        # Every token is already on the wire, yet the producer stops at the
+        # buffer size instead of reading them all.
+        await asyncio.sleep(0.3)
+        assert queues[0].full() and queues[0].qsize() == 2
+        assert not producers()[0].done()
+        tokens += [token async for token in stream]
+        return tokens
+
+    tokens = asyncio.run(consume_slowly())
+    assert tokens == [f"token{i} " for i in range(llm.TOKENS)]
+
+
+def test_closing_early_cancels_the_producer(llm, monkeypatch):
+    monkeypatch.setattr(llm, "TOKENS", 1000)
+    monkeypatch.setattr(llm, "TOKEN_DELAY", 0.01)
+
+    async def read_three():
+        stream = OpenAIChat().stream("hi")
+        tokens = [await stream.__anext__() for _ in range(3)]
+        (producer,) = producers()
+        await stream.aclose()
+        assert producer.cancelled()
+        for _ in range(100):
+            if llm.streams["cancelled"]:
+                break
+            await asyncio.sleep(0.05)
+        return tokens
+
+    assert asyncio.run(read_three()) == ["token0 ", "token1 ", "token2 "]
+    assert llm.streams == {"started": 1, "finished": 0, "cancelled": 1}
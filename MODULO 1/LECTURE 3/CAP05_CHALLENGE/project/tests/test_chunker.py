@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from retrieval.chunker import SEPARATORS, RecursiveCharacterSplitter
+
+WORDS = ["a", "lorem", "ipsum", "x" * 30, "dolor", "y" * 100, "  ", "\t"]
+BREAKS = [" ", "\n", "\n\n", "\n\n\n", " \n "]
+
+
+def random_text(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(0, 600)):
+        parts.append(rng.choice(WORDS) if rng.random() < 0.8 else rng.choice(BREAKS))
+        parts.append(rng.choice([" ", "", "\n"]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize(
+    "chunk_size, chunk_overlap",
+    [(400, 50), (50, 10), (20, 0), (100, 99), (10, 5), (1, 0)],
+)
+@pytest.mark.parametrize("length_function", [len, lambda s: len(s.encode()) // 2])
+def test_matches_langchain(chunk_size, chunk_overlap, length_function):
+    text_splitter = pytest.importorskip("langchain.text_splitter")
+    reference = text_splitter.RecursiveCharacterTextSplitter(
+        separators=list(SEPARATORS),
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=length_function,
+    )
+    splitter = RecursiveCharacterSplitter(chunk_size, chunk_overlap, length_function)
+    rng = random.Random(chunk_size * 1000 + chunk_overlap)
+
+    for _ in range(100):
+        text = random_text(rng)
+        chunks = list(splitter.chunks(text))
+        assert [chunk.text for chunk in chunks] == reference.split_text(text)
+
+
+def test_offsets_point_into_text():
+    text = random_text(random.Random(0))
+    for chunk in RecursiveCharacterSplitter(50, 10).chunks(text):
+        assert text[chunk.start : chunk.end] == chunk.text
+
+
+def test_overlap_larger_than_size():
+    with pytest.raises(ValueError):
+        RecursiveCharacterSplitter(chunk_size=10, chunk_overlap=20)
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from mocks import fake_embeddings_server
+from retrieval.embeddings import BatchedEmbeddings, RemoteEmbeddings
+from util.http import HttpPool
+
+
+@pytest.fixture
+def url(serve, monkeypatch):
+    monkeypatch.setattr(fake_embeddings_server, "LATENCY", 0.05)
+    monkeypatch.setattr(fake_embeddings_server, "PER_TEXT", 0)
+    monkeypatch.setattr(fake_embeddings_server, "calls", {"requests": 0, "texts": 0})
+    return serve(fake_embeddings_server.app) + "/encode"
+
+
+def embed(url: str, batches: list[list[str]], batched: bool = False):
+    async def run():
+        http = HttpPool()
+        embeddings = RemoteEmbeddings(url, http=http)
+        if batched:
+            embeddings = BatchedEmbeddings(embeddings, max_wait=0.01)
+        try:
+            return await asyncio.gather(*[embeddings.run(b) for b in batches])
+        finally:
+            await http.close()
+
+    return asyncio.run(run())
+
+
+def test_vectors_follow_the_input_order(url):
+    texts = ["alpha", "beta", "gamma", "alpha"]
+    (vectors,) = embed(url, [texts])
+
+    expected = [fake_embeddings_server.fake_vector(text) for text in texts]
+    assert vectors == expected
+    assert len(vectors[0]) == RemoteEmbeddings.vector_dimension
+
+
+def test_concurrent_callers_share_one_request(url):
+    batches = [["one", "two"], ["three"], ["four", "five", "six"]]
+    results = embed(url, batches, batched=True)
+
+    for texts, vectors in zip(batches, results):
+        expected = [fake_embeddings_server.fake_vector(text) for text in texts]
+        assert vectors == expected
+    assert fake_embeddings_server.calls == {"requests": 1, "texts": 6}
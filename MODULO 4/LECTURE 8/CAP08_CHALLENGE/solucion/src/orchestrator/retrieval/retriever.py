@@ -1,16 +1,14 @@
 import asyncio
 import json
 import time
-from typing import Any, AsyncGenerator
-import numpy as np
-import pandas as pd
+from typing import AsyncGenerator
 from util import logger
 from models.document import Document
 from retrieval.search import Searcher
 from retrieval.splitter import Splitter
 from retrieval.scraper import Scraper
 from retrieval.embeddings import Embeddings
-from sklearn.metrics.pairwise import cosine_similarity
+from retrieval.similarity import cosine_scores, top_k
 from models.search import SearchDoc, SearchResult
 
 
@@ -88,20 +86,19 @@ class Retriever:
     async def get_most_similar(self, query_vector, data, k=5) -> list[Document]:
         """Get most relevant texts based on cosine similarity"""
 
-        query_vector = np.array(query_vector).reshape(1, -1)
-
-        def compute_cosine_similarity(row):
-            return cosine_similarity(query_vector, row)[0][0]
-
-        df: Any = pd.DataFrame(data)
-        df["vector"] = df["vector"].apply(lambda x: np.array(x).reshape(1, -1))
-        df["similarity"] = df["vector"].apply(compute_cosine_similarity)
-        similar = df.nlargest(k, "similarity")[["text", "url", "vector", "similarity"]]
-        similar["vector"] = similar["vector"].apply(lambda x: x[0].tolist())
-
-        json_docs = similar.to_dict("records")
-
-        return [Document(**json_doc) for json_doc in json_docs]
+        if not data:
+            return []
+
+        scores = cosine_scores(query_vector, [doc["vector"] for doc in data])
+        return [
+            Document(
+                text=data[i]["text"],
+                url=data[i]["url"],
+                vector=data[i]["vector"],
+                similarity=float(scores[i]),
+            )
+            for i in top_k(scores, k)
+        ]
 
     async def evaluate_retrieval(
         self, documents: list[Document], treshold: float